@@ -44,11 +44,12 @@ from contextlib import asynccontextmanager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup logic
-    print("🚀 Pre-loading embedding model...")
+    # Load the embedding model alongside startup; the first search waits for it if needed
+    print("🚀 Pre-loading embedding model in the background...")
     retriever.warmup()
-    print("✓ Model loaded and ready.")
     yield
-    # Shutdown logic (none needed)
+    # Shutdown logic
+    retriever.close()
 
 app = FastAPI(
     title="Wisp Tool Discovery API",
@@ -118,12 +119,15 @@ async def search_tools(
         raise HTTPException(status_code=500, detail=f"Error during retrieval: {str(e)}")
 
 @app.get("/servers/{server_name:path}/tools")
-async def list_server_tools(server_name: str):
+async def list_server_tools(
+    server_name: str,
+    include_schemas: bool = Query(True, description="Include each tool's parsed input schema")
+):
     """
     List all tools available on a specific server.
     """
     try:
-        tools = retriever.get_tools_for_server(server_name)
+        tools = retriever.get_tools_for_server(server_name, load_schemas=include_schemas)
         return {"server": server_name, "tools": tools}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving tools for server: {str(e)}")
@@ -4,11 +4,10 @@ Add curated MCP servers from user's selection.
 These servers are hand-picked as interesting for usage.
 """
 
-import sqlite3
 from pathlib import Path
 from datetime import datetime
 
-DATABASE_PATH = Path(__file__).parent / "mcp_registry.db"
+from db import DATABASE_PATH, get_connection
 
 # Curated servers with researched details
 CURATED_SERVERS = [
@@ -281,8 +280,7 @@ CURATED_SERVERS = [
 
 def add_curated_servers():
     """Add curated servers to the database."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_connection(DATABASE_PATH)
     cursor = conn.cursor()
     
     added = 0
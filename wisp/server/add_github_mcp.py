@@ -3,20 +3,18 @@
 Register the GitHub MCP server in the Wisp database.
 """
 
-import sqlite3
 import json
 from pathlib import Path
 from datetime import datetime
 
-DATABASE_PATH = Path(__file__).parent / "mcp_registry.db"
+from db import DATABASE_PATH, get_connection
 
 def add_github_server():
     """Add GitHub MCP server to the database."""
     print(f"🎯 Registering GitHub MCP Server")
     print("="*60)
     
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_connection(DATABASE_PATH)
     cursor = conn.cursor()
     
     server_name = "github"
@@ -5,9 +5,11 @@ Shared Database Utilities for MCP Registry
 Contains database schema, connection utilities, and common constants.
 """
 
+import json
 import math
 import os
 import sqlite3
+import zlib
 from pathlib import Path
 from typing import Optional
 
@@ -20,7 +22,9 @@ SQLITE_VEC_PATH = os.environ.get("SQLITE_VEC_PATH")  # Path to sqlite-vec extens
 def get_connection(db_path: Optional[Path] = None, load_vec: bool = False) -> sqlite3.Connection:
     """Get a database connection with row factory and WAL mode for better concurrency."""
     path = db_path or DATABASE_PATH
-    conn = sqlite3.connect(path, timeout=30.0)  # Wait up to 30s for locks
+    # Wait up to 30s for locks; a larger statement cache keeps the bulk
+    # extract/enrich statements prepared across calls
+    conn = sqlite3.connect(path, timeout=30.0, cached_statements=256)
     conn.row_factory = sqlite3.Row
     
     # Register common math functions not native to SQLite
@@ -33,8 +37,16 @@ def get_connection(db_path: Optional[Path] = None, load_vec: bool = False) -> sq
             
     conn.create_function("log1p", 1, safe_log1p)
     
-    # Load vector extension if requested
-    if load_vec:
+    # log10/exp are only built in when SQLite was compiled with math functions
+    try:
+        conn.execute("SELECT log10(1), exp(0)")
+    except sqlite3.OperationalError:
+        conn.create_function("log10", 1, lambda x: None if x is None else math.log10(x), deterministic=True)
+        conn.create_function("exp", 1, lambda x: None if x is None else math.exp(x), deterministic=True)
+    
+    # Load vector extension if requested (Python builds without extension
+    # loading get a plain connection; callers can probe vec_version())
+    if load_vec and hasattr(conn, "enable_load_extension"):
         conn.enable_load_extension(True)
         # Attempt to load sqlite-vec
         try:
@@ -50,14 +62,346 @@ def get_connection(db_path: Optional[Path] = None, load_vec: bool = False) -> sq
                 except:
                     pass
     
-    # Performance tuning
+    # Performance tuning (busy timeout comes from the connect() timeout above)
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA synchronous=NORMAL")
     conn.execute("PRAGMA foreign_keys=ON")
+    # INSERT OR REPLACE only fires DELETE triggers with this on; the listing
+    # FTS triggers rely on it to drop the replaced row's terms
+    conn.execute("PRAGMA recursive_triggers=ON")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")  # 256 MiB memory-mapped reads
+    conn.execute("PRAGMA cache_size=-131072")  # 128 MiB page cache
+    conn.execute("PRAGMA wal_autocheckpoint=1000")
     
     return conn
 
 
+def decode_raw_json(value) -> Optional[dict]:
+    """
+    Decode a servers.raw_json value.
+    
+    New rows store zlib-compressed compact JSON as a BLOB; rows written by
+    older extractor versions hold plain JSON text.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = zlib.decompress(value)
+    return json.loads(value)
+
+
+# Registry child tables whose rows belong to one server and are replaced with it
+CASCADE_CHILD_TABLES = ("server_packages", "server_remotes", "environment_variables", "server_icons")
+
+
+def _stale_cascade_tables(cursor) -> list:
+    """Child tables whose servers FK still lacks ON DELETE CASCADE."""
+    return [
+        table for table in CASCADE_CHILD_TABLES
+        if any(
+            fk["table"] == "servers" and fk["on_delete"] != "CASCADE"
+            for fk in cursor.execute(f"PRAGMA foreign_key_list({table})").fetchall()
+        )
+    ]
+
+
+def _migrate_child_fk_cascade(conn: sqlite3.Connection):
+    """
+    Rebuild registry child tables created before their servers FK had
+    ON DELETE CASCADE. SQLite cannot alter a constraint in place, so each
+    table is copied into a new definition and swapped in; its indexes are
+    recreated by create_full_schema afterwards.
+    """
+    cursor = conn.cursor()
+    if not _stale_cascade_tables(cursor):
+        return
+    
+    conn.commit()
+    # Both pragmas are no-ops inside a transaction, so set them first
+    cursor.execute("PRAGMA foreign_keys=OFF")
+    cursor.execute("PRAGMA legacy_alter_table=ON")  # Don't re-validate views on rename
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        # Re-check under the write lock in case another connection migrated first
+        for table in _stale_cascade_tables(cursor):
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+            create_sql = cursor.fetchone()[0]
+            create_sql = create_sql.replace(f"CREATE TABLE {table}", f"CREATE TABLE {table}__new", 1)
+            create_sql = create_sql.replace("REFERENCES servers(name)", "REFERENCES servers(name) ON DELETE CASCADE")
+            cursor.execute(create_sql)
+            cursor.execute(f"INSERT INTO {table}__new SELECT * FROM {table}")
+            cursor.execute(f"DROP TABLE {table}")
+            cursor.execute(f"ALTER TABLE {table}__new RENAME TO {table}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute("PRAGMA legacy_alter_table=OFF")
+        cursor.execute("PRAGMA foreign_keys=ON")
+
+
+def _migrate_server_counts(conn: sqlite3.Connection):
+    """
+    Add the trigger-maintained requires_auth/tool_count columns to a servers
+    table that predates them, backfilled from the child tables.
+    """
+    cursor = conn.cursor()
+    columns = {row["name"] for row in cursor.execute("PRAGMA table_info(servers)").fetchall()}
+    if "tool_count" in columns:
+        return
+    
+    cursor.execute("ALTER TABLE servers ADD COLUMN requires_auth INTEGER DEFAULT 0")
+    cursor.execute("ALTER TABLE servers ADD COLUMN tool_count INTEGER DEFAULT 0")
+    cursor.execute("""
+        UPDATE servers SET
+            requires_auth = EXISTS (
+                SELECT 1 FROM environment_variables ev
+                WHERE ev.server_name = servers.name AND ev.is_secret = 1
+            ),
+            tool_count = (SELECT COUNT(*) FROM tools t WHERE t.server_name = servers.name)
+    """)
+    conn.commit()
+
+
+# Recomputes servers.requires_auth for one server name (bound as {name})
+_REQUIRES_AUTH_UPDATE = """
+    UPDATE servers SET requires_auth = EXISTS (
+        SELECT 1 FROM environment_variables
+        WHERE server_name = {name} AND is_secret = 1
+    ) WHERE name = {name};
+"""
+
+
+def _create_server_count_triggers(conn: sqlite3.Connection):
+    """
+    Keep servers.requires_auth (has a secret env var) and servers.tool_count
+    in step with environment_variables and tools, so listings read them
+    directly instead of aggregating the child tables.
+    """
+    cursor = conn.cursor()
+    
+    # A (re)inserted server picks up whatever child rows already exist
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS servers_counts_ai AFTER INSERT ON servers BEGIN
+            UPDATE servers SET
+                requires_auth = EXISTS (
+                    SELECT 1 FROM environment_variables
+                    WHERE server_name = new.name AND is_secret = 1
+                ),
+                tool_count = (SELECT COUNT(*) FROM tools WHERE server_name = new.name)
+            WHERE id = new.id;
+        END
+    """)
+    
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS env_auth_ai AFTER INSERT ON environment_variables
+        WHEN new.is_secret = 1 BEGIN
+            UPDATE servers SET requires_auth = 1 WHERE name = new.server_name;
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS env_auth_ad AFTER DELETE ON environment_variables
+        WHEN old.is_secret = 1 BEGIN
+            {_REQUIRES_AUTH_UPDATE.format(name="old.server_name")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS env_auth_au AFTER UPDATE OF server_name, is_secret ON environment_variables BEGIN
+            {_REQUIRES_AUTH_UPDATE.format(name="old.server_name")}
+            {_REQUIRES_AUTH_UPDATE.format(name="new.server_name")}
+        END
+    """)
+    
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS tools_count_ai AFTER INSERT ON tools BEGIN
+            UPDATE servers SET tool_count = tool_count + 1 WHERE name = new.server_name;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS tools_count_ad AFTER DELETE ON tools BEGIN
+            UPDATE servers SET tool_count = tool_count - 1 WHERE name = old.server_name;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS tools_count_au AFTER UPDATE OF server_name ON tools BEGIN
+            UPDATE servers SET tool_count = tool_count - 1 WHERE name = old.server_name;
+            UPDATE servers SET tool_count = tool_count + 1 WHERE name = new.server_name;
+        END
+    """)
+
+
+SERVER_COUNT_TRIGGERS = (
+    "servers_counts_ai",
+    "env_auth_ai", "env_auth_ad", "env_auth_au",
+    "tools_count_ai", "tools_count_ad", "tools_count_au",
+)
+
+
+# External-content FTS5 indexes behind the visualize --search listings:
+# (fts table, content table, indexed columns). Content rowids are the tables' ids.
+LISTING_FTS_TABLES = (
+    ("servers_fts", "servers", ("name", "description")),
+    ("tools_list_fts", "tools", ("tool_name", "description")),
+)
+
+
+def ensure_listing_schema(conn: sqlite3.Connection):
+    """
+    Add the trigger-maintained server counts and the listing FTS indexes to a
+    registry created before them, without running all of create_full_schema.
+    Read-side tools (visualize.py) call this when they open the database; once
+    everything exists it is a single sqlite_master lookup.
+    """
+    cursor = conn.cursor()
+    names = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+    if not {"servers", "tools", "environment_variables"} <= names:
+        return
+    
+    expected = set(SERVER_COUNT_TRIGGERS)
+    for fts, _, _ in LISTING_FTS_TABLES:
+        expected |= {fts, f"{fts}_ai", f"{fts}_ad", f"{fts}_au"}
+    if expected <= names:
+        return
+    
+    _migrate_server_counts(conn)
+    _create_server_count_triggers(conn)
+    _create_listing_fts(conn)
+    conn.commit()
+
+
+def _create_listing_fts(conn: sqlite3.Connection):
+    """
+    Create the listing FTS5 indexes and the triggers that keep them in step
+    with their content tables. An index created over a table that already
+    has rows is filled with a one-off rebuild.
+    """
+    cursor = conn.cursor()
+    for fts, table, columns in LISTING_FTS_TABLES:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (fts,))
+        exists = cursor.fetchone() is not None
+        
+        cols = ", ".join(columns)
+        new_cols = ", ".join(f"new.{c}" for c in columns)
+        old_cols = ", ".join(f"old.{c}" for c in columns)
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {cols},
+                content='{table}',
+                content_rowid='id'
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+            END
+        """)
+        
+        if not exists:
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES('rebuild')")
+
+
+# Tool embeddings are unit-length vectors stored as int8 scaled by this factor
+EMBEDDING_INT8_SCALE = 127
+
+TOOL_EMBEDDINGS_DDL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tool_embeddings USING vec0(
+        tool_id INTEGER PRIMARY KEY,
+        embedding INT8[768],
+        +doc_hash BLOB
+    )
+"""
+
+
+def _migrate_embeddings_int8(conn: sqlite3.Connection):
+    """
+    Re-quantize a FLOAT[768] tool_embeddings table (pre-int8 schema) into
+    INT8[768], using the same round(x * EMBEDDING_INT8_SCALE) mapping as
+    RelevanceEngine so existing vectors don't need re-encoding.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'tool_embeddings'")
+    row = cursor.fetchone()
+    if row is None or "FLOAT[" not in row[0].upper():
+        return
+    
+    # Needs sqlite-vec; connections opened without load_vec leave it for later
+    try:
+        cursor.execute("SELECT vec_version()")
+    except sqlite3.OperationalError:
+        return
+    
+    conn.commit()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(f"""
+            CREATE TEMP TABLE tool_embeddings_int8 AS
+            SELECT
+                e.tool_id,
+                (SELECT json_group_array(CAST(round(value * {EMBEDDING_INT8_SCALE}) AS INTEGER))
+                 FROM (SELECT value FROM vec_each(e.embedding) ORDER BY rowid)) AS embedding
+            FROM tool_embeddings e
+        """)
+        cursor.execute("DROP TABLE tool_embeddings")
+        cursor.execute(TOOL_EMBEDDINGS_DDL)
+        cursor.execute("""
+            INSERT INTO tool_embeddings(tool_id, embedding)
+            SELECT tool_id, vec_int8(embedding) FROM temp.tool_embeddings_int8
+        """)
+        cursor.execute("DROP TABLE temp.tool_embeddings_int8")
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        conn.rollback()
+        print(f"Warning: Could not convert tool_embeddings to int8 (sqlite-vec likely missing): {e}")
+
+
+def _migrate_embeddings_doc_hash(conn: sqlite3.Connection):
+    """
+    Rebuild a tool_embeddings table that predates the doc_hash auxiliary
+    column (vec0 has no ALTER TABLE), keeping the stored vectors. Hashes start
+    out NULL and are backfilled by RelevanceEngine.update_embeddings.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'tool_embeddings'")
+    row = cursor.fetchone()
+    if row is None or "doc_hash" in row[0] or "FLOAT[" in row[0].upper():
+        return
+    
+    # Needs sqlite-vec; connections opened without load_vec leave it for later
+    try:
+        cursor.execute("SELECT vec_version()")
+    except sqlite3.OperationalError:
+        return
+    
+    conn.commit()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("CREATE TEMP TABLE tool_embeddings_old AS SELECT tool_id, embedding FROM tool_embeddings")
+        cursor.execute("DROP TABLE tool_embeddings")
+        cursor.execute(TOOL_EMBEDDINGS_DDL)
+        cursor.execute("""
+            INSERT INTO tool_embeddings(tool_id, embedding)
+            SELECT tool_id, vec_int8(embedding) FROM temp.tool_embeddings_old
+        """)
+        cursor.execute("DROP TABLE temp.tool_embeddings_old")
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        conn.rollback()
+        print(f"Warning: Could not add doc_hash to tool_embeddings (sqlite-vec likely missing): {e}")
+
+
 def create_full_schema(conn: sqlite3.Connection):
     """
     Create the complete database schema.
@@ -92,8 +436,10 @@ def create_full_schema(conn: sqlite3.Connection):
             status TEXT,
             published_at TIMESTAMP,
             updated_at TIMESTAMP,
-            raw_json TEXT,
-            extracted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            raw_json BLOB,  -- zlib-compressed JSON (see decode_raw_json)
+            extracted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            requires_auth INTEGER DEFAULT 0,  -- maintained by triggers (see _create_server_count_triggers)
+            tool_count INTEGER DEFAULT 0
         )
     """)
     
@@ -110,7 +456,7 @@ def create_full_schema(conn: sqlite3.Connection):
             runtime_hint TEXT,
             file_sha256 TEXT,
             raw_json TEXT,
-            FOREIGN KEY (server_name) REFERENCES servers(name)
+            FOREIGN KEY (server_name) REFERENCES servers(name) ON DELETE CASCADE
         )
     """)
     
@@ -122,7 +468,7 @@ def create_full_schema(conn: sqlite3.Connection):
             transport_type TEXT,
             url TEXT,
             headers_json TEXT,
-            FOREIGN KEY (server_name) REFERENCES servers(name)
+            FOREIGN KEY (server_name) REFERENCES servers(name) ON DELETE CASCADE
         )
     """)
     
@@ -138,7 +484,7 @@ def create_full_schema(conn: sqlite3.Connection):
             format TEXT,
             default_value TEXT,
             choices TEXT,
-            FOREIGN KEY (server_name) REFERENCES servers(name)
+            FOREIGN KEY (server_name) REFERENCES servers(name) ON DELETE CASCADE
         )
     """)
     
@@ -151,7 +497,7 @@ def create_full_schema(conn: sqlite3.Connection):
             mime_type TEXT,
             theme TEXT,
             sizes TEXT,
-            FOREIGN KEY (server_name) REFERENCES servers(name)
+            FOREIGN KEY (server_name) REFERENCES servers(name) ON DELETE CASCADE
         )
     """)
     
@@ -397,16 +743,21 @@ def create_full_schema(conn: sqlite3.Connection):
     # Tool Embeddings (Virtual table for vector search via sqlite-vec)
     # We load the extension before creating this
     try:
-        cursor.execute("""
-            CREATE VIRTUAL TABLE IF NOT EXISTS tool_embeddings USING vec0(
-                tool_id INTEGER PRIMARY KEY,
-                embedding FLOAT[768]
-            )
-        """)
+        cursor.execute(TOOL_EMBEDDINGS_DDL)
     except sqlite3.OperationalError as e:
         # If sqlite-vec is not loaded/available, we skip for now but log
         print(f"Warning: Could not create tool_embeddings table (sqlite-vec likely missing): {e}")
     
+    _migrate_embeddings_int8(conn)
+    _migrate_embeddings_doc_hash(conn)
+    _migrate_child_fk_cascade(conn)
+    
+    # Listing search indexes and server counts; after the cascade rebuild,
+    # which would drop the triggers along with the old child tables
+    _migrate_server_counts(conn)
+    _create_server_count_triggers(conn)
+    _create_listing_fts(conn)
+    
     # ==================== INDEXES ====================
     
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_servers_status ON servers(status)")
@@ -416,10 +767,12 @@ def create_full_schema(conn: sqlite3.Connection):
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_remotes_server ON server_remotes(server_name)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_env_server ON environment_variables(server_name)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_env_secret ON environment_variables(is_secret)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_envvars_secret ON environment_variables(server_name, is_secret)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_tools_server ON tools(server_name)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_tools_name ON tools(tool_name)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_resources_server ON resources(server_name)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_prompts_server ON prompts(server_name)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tes_status ON tool_extraction_status(status)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_deps_server ON dependency_signals(server_name)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_deps_count ON dependency_signals(dependents_count)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_config_server ON config_references(server_name)")
@@ -45,6 +45,13 @@ import numpy as np  # For more robust percentiles if needed, but we'll use a sim
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeRemainingColumn, MofNCompleteColumn
 
+# orjson is optional - much faster decoding of the per-row JSON columns
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 from db import DATABASE_PATH, get_connection, init_database
 # from relevance import RelevanceEngine
 # from retriever import Retriever
@@ -167,6 +174,42 @@ def exponential_backoff_request(
     return None
 
 
+# ==================== PROGRESS HELPERS ====================
+
+class BatchedProgress:
+    """
+    Coalesces per-row progress advances for a single Rich task.
+    
+    Forwards to progress.update() every `every` advances or `interval` seconds,
+    whichever comes first. Call flush() when the loop finishes.
+    """
+    
+    def __init__(self, progress: Progress, task_id, every: int = 64, interval: float = 0.1):
+        self.progress = progress
+        self.task_id = task_id
+        self.every = every
+        self.interval = interval
+        self._pending = 0
+        self._description = None
+        self._last_flush = time.monotonic()
+    
+    def advance(self, n: int = 1, description: Optional[str] = None):
+        self._pending += n
+        if description is not None:
+            self._description = description
+        if self._pending >= self.every or time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+    
+    def flush(self):
+        if self._description is not None:
+            self.progress.update(self.task_id, advance=self._pending, description=self._description)
+        elif self._pending:
+            self.progress.update(self.task_id, advance=self._pending)
+        self._pending = 0
+        self._description = None
+        self._last_flush = time.monotonic()
+
+
 # ==================== ENRICHMENT STATUS TRACKING ====================
 
 def categorize_enrichment_failure(status_code: int = None, error_message: str = None) -> tuple:
@@ -345,6 +388,7 @@ def create_enrichment_schema(conn):
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_github_stars ON github_signals(stars)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_github_push ON github_signals(last_push)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_downloads_server ON package_downloads(server_name)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_downloads_monthly ON package_downloads(downloads_last_month)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_crosslist_server ON cross_listings(server_name)")
     
     conn.commit()
@@ -511,6 +555,8 @@ def enrich_github(db_path: Path = DATABASE_PATH, token: Optional[str] = None, li
                 data.get('default_branch'),
                 datetime.now(timezone.utc).isoformat()
             ))
+            # Commit per row so enrichers running alongside aren't starved of the write lock
+            conn.commit()
             if progress:
                 progress.console.print(f"  [cyan]GitHub:[/cyan] {server_name} ({owner}/{repo}) [green]✓ {data.get('stargazers_count', 0)}⭐[/green]")
             else:
@@ -954,10 +1000,11 @@ def enrich_glama(db_path: Path = DATABASE_PATH, progress: Optional[Progress] = N
         q = query.lower()
         our_servers = {name: data for name, data in our_servers.items() if q in name.lower()}
     
-    matched = 0
+    matches = []
+    ticker = BatchedProgress(progress, task_id) if progress else None
     for glama_server in all_glama:
-        if progress:
-            progress.update(task_id, advance=1)
+        if ticker:
+            ticker.advance()
         
         # Match by name or repo URL
         glama_name = glama_server.get('name', '')
@@ -985,12 +1032,7 @@ def enrich_glama(db_path: Path = DATABASE_PATH, progress: Optional[Progress] = N
         
         if match_name:
             spdx = glama_server.get('spdxLicense', {})
-            cursor.execute("""
-                INSERT OR REPLACE INTO cross_listings 
-                (server_name, registry_name, registry_id, registry_url, 
-                 attributes, license_name, license_url, enriched_at)
-                VALUES (?, 'glama', ?, ?, ?, ?, ?, ?)
-            """, (
+            matches.append((
                 match_name,
                 glama_server.get('id'),
                 glama_server.get('url'),
@@ -999,9 +1041,20 @@ def enrich_glama(db_path: Path = DATABASE_PATH, progress: Optional[Progress] = N
                 spdx.get('url') if spdx else None,
                 datetime.now(timezone.utc).isoformat()
             ))
-            matched += 1
     
+    if ticker:
+        ticker.flush()
+    
+    # Written in one short transaction after matching, so the write lock isn't
+    # held through the cross-reference scan while other enrichers commit
+    cursor.executemany("""
+        INSERT OR REPLACE INTO cross_listings 
+        (server_name, registry_name, registry_id, registry_url, 
+         attributes, license_name, license_url, enriched_at)
+        VALUES (?, 'glama', ?, ?, ?, ?, ?, ?)
+    """, matches)
     conn.commit()
+    matched = len(matches)
     conn.close()
     if not progress:
         print(f"\n✓ Matched {matched} servers with Glama registry")
@@ -1076,10 +1129,11 @@ def analyze_service_costs(db_path: Path = DATABASE_PATH, progress: Optional[Prog
     servers = cursor.fetchall()
     if progress:
         progress.update(task_id, total=len(servers))
+    ticker = BatchedProgress(progress, task_id) if progress else None
         
     for server in servers:
-        if progress:
-            progress.update(task_id, advance=1)
+        if ticker:
+            ticker.advance()
         server_name = server['name']
         secret_vars = server['secret_vars'] or ''
         
@@ -1115,6 +1169,9 @@ def analyze_service_costs(db_path: Path = DATABASE_PATH, progress: Optional[Prog
             ))
             analyzed += 1
     
+    if ticker:
+        ticker.flush()
+    
     conn.commit()
     conn.close()
     if not progress:
@@ -1233,6 +1290,8 @@ def enrich_dependents(db_path: Path = DATABASE_PATH, api_key: Optional[str] = No
                 data['sourcerank'],
                 datetime.now(timezone.utc).isoformat()
             ))
+            # Commit per row so enrichers running alongside aren't starved of the write lock
+            conn.commit()
             if progress:
                 deps = data['dependents_count'] or 0
                 repos = data['dependent_repos_count'] or 0
@@ -1643,7 +1702,7 @@ def compute_backlink_scores(db_path: Path = DATABASE_PATH, token: Optional[str]
     cursor.execute("SELECT DISTINCT sample_repos FROM config_references WHERE sample_repos IS NOT NULL")
     all_sample_repos = set()
     for row in cursor.fetchall():
-        repos = json.loads(row['sample_repos'])
+        repos = json_loads(row['sample_repos'])
         all_sample_repos.update(repos)
     
     # Filter repos that already have metadata cached
@@ -1672,6 +1731,7 @@ def compute_backlink_scores(db_path: Path = DATABASE_PATH, token: Optional[str]
         # Fetch missing metadata in parallel
         # Note: GitHub search limit is low, but GET repo metadata is higher (5000/hr)
         # We use a reasonable thread pool size
+        fetched_at = datetime.now(timezone.utc).isoformat()
         with ThreadPoolExecutor(max_workers=10) as executor:
             future_to_repo = {executor.submit(fetch_meta, repo): repo for repo in missing_repos}
             for future in as_completed(future_to_repo):
@@ -1689,7 +1749,7 @@ def compute_backlink_scores(db_path: Path = DATABASE_PATH, token: Optional[str]
                         meta['pushed_at'],
                         meta['is_archived'],
                         meta['is_fork'],
-                        datetime.now(timezone.utc).isoformat()
+                        fetched_at
                     ))
                     # Also update existing edges if they exist but lack metadata
                     cursor.execute("""
@@ -1706,26 +1766,53 @@ def compute_backlink_scores(db_path: Path = DATABASE_PATH, token: Optional[str]
             progress.update(meta_task_id, visible=False)
 
     # ========== Stage 2: Scoring Loop (Now hitting DB cache) ==========
-    # Get all servers
-    cursor.execute("SELECT name, repository_url FROM servers")
-    servers = cursor.fetchall()
-    
-    # Filter by query if provided
+    # Get all servers, filtering by query in SQL if provided
+    where = ''
+    params = []
     if query:
-        q = query.lower()
-        servers = [s for s in servers if q in s['name'].lower()]
+        q = query.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        where = "WHERE LOWER(name) LIKE ? ESCAPE '\\'"
+        params = [f"%{q}%"]
+    cursor.execute(f"SELECT name, repository_url FROM servers {where}", params)
+    servers = cursor.fetchall()
         
     if progress:
         progress.update(score_task_id, total=len(servers))
     
+    # ========== Dependency signals (Tier 2), vectorized ==========
+    # For dependencies, we don't have individual repos - each package gets a
+    # synthetic score: log1p dampens very high dependent counts, sqrt dampens
+    # large repo counts. Computed for every row at once and summed per server.
+    cursor.execute("""
+        SELECT server_name, dependents_count, dependent_repos_count
+        FROM dependency_signals
+    """)
+    dep_rows = cursor.fetchall()
+    tier2_by_server = {}
+    if dep_rows:
+        n_deps = len(dep_rows)
+        server_index = {}
+        dep_idx = np.fromiter(
+            (server_index.setdefault(d['server_name'], len(server_index)) for d in dep_rows),
+            dtype=np.intp, count=n_deps
+        )
+        dependents = np.fromiter((d['dependents_count'] or 0 for d in dep_rows), dtype=np.float64, count=n_deps)
+        dep_repos = np.fromiter((d['dependent_repos_count'] or 0 for d in dep_rows), dtype=np.float64, count=n_deps)
+        
+        dep_scores = TIER_WEIGHTS['tier2_dependency'] * np.log1p(dependents) * np.sqrt(1 + dep_repos / 100)
+        tier2_totals = np.zeros(len(server_index), dtype=np.float64)
+        np.add.at(tier2_totals, dep_idx, dep_scores)
+        tier2_by_server = dict(zip(server_index, tier2_totals.tolist()))
+    
     # Store results for second pass normalization
     server_raw_results = {}
     computed = 0
     
+    ticker = BatchedProgress(progress, score_task_id) if progress else None
     for server in servers:
         server_name = server['name']
-        if progress:
-            progress.update(score_task_id, advance=1, description=f"[bold white]Scoring: {server_name}")
+        if ticker:
+            ticker.advance(description=f"[bold white]Scoring: {server_name}")
             
         own_repo = None
         
@@ -1754,7 +1841,7 @@ def compute_backlink_scores(db_path: Path = DATABASE_PATH, token: Optional[str]
         
         for ref in cursor.fetchall():
             config_type = ref['config_type']
-            sample_repos = json.loads(ref['sample_repos']) if ref['sample_repos'] else []
+            sample_repos = json_loads(ref['sample_repos']) if ref['sample_repos'] else []
             tier = CONFIG_TYPE_TO_TIER.get(config_type, "tier1_config")
             tier_weight = TIER_WEIGHTS.get(tier, 0.5)
             
@@ -1775,16 +1862,14 @@ def compute_backlink_scores(db_path: Path = DATABASE_PATH, token: Optional[str]
                 unique_repos.add(repo_tier_key)
                 
                 # Try to get repo metadata (now guaranteed to be in DB if we pre-fetched)
+                # Prefer a row that actually carries metadata (NULL stars sort last)
                 cursor.execute("""
                     SELECT repo_stars, repo_pushed_at, is_archived, is_fork
                     FROM backlink_edges
-                    WHERE referencer_repo = ? AND repo_stars IS NULL
-                    UNION
-                    SELECT repo_stars, repo_pushed_at, is_archived, is_fork
-                    FROM backlink_edges
-                    WHERE referencer_repo = ? AND repo_stars IS NOT NULL
+                    WHERE referencer_repo = ?
+                    ORDER BY (repo_stars IS NULL)
                     LIMIT 1
-                """, (repo_fullname, repo_fullname))
+                """, (repo_fullname,))
                 existing = cursor.fetchone()
                 
                 if existing and existing['repo_stars'] is not None:
@@ -1799,40 +1884,21 @@ def compute_backlink_scores(db_path: Path = DATABASE_PATH, token: Optional[str]
                 edge_score = compute_edge_score(tier_weight, stars, pushed_at, is_archived, is_fork)
                 tier_contributions['tier1'] += edge_score
                 
-                edges_to_store.append({
-                    'server_name': server_name,
-                    'referencer_repo': repo_fullname,
-                    'tier': tier,
-                    'tier_weight': tier_weight,
-                    'repo_stars': stars,
-                    'repo_pushed_at': pushed_at,
-                    'is_archived': is_archived,
-                    'is_fork': is_fork,
-                    'edge_score': edge_score,
-                })
+                # Stored as a tuple in backlink_edges column order (minus created_at)
+                edges_to_store.append((
+                    server_name,
+                    repo_fullname,
+                    tier,
+                    tier_weight,
+                    stars,
+                    pushed_at,
+                    is_archived,
+                    is_fork,
+                    edge_score,
+                ))
         
-        # ========== Process dependency signals (Tier 2) ==========
-        cursor.execute("""
-            SELECT package_name, platform, dependents_count, dependent_repos_count, sourcerank
-            FROM dependency_signals
-            WHERE server_name = ?
-        """, (server_name,))
-        
-        for dep in cursor.fetchall():
-            # For dependencies, we don't have individual repos
-            # Use aggregate count with a synthetic edge score
-            dependents = dep['dependents_count'] or 0
-            repos = dep['dependent_repos_count'] or 0
-            sourcerank = dep['sourcerank'] or 0
-            
-            # Create a synthetic score based on dependent count
-            # log1p to dampen very high counts
-            tier_weight = TIER_WEIGHTS['tier2_dependency']
-            
-            # Each dependent contributes a small amount
-            # Use sqrt to dampen large numbers
-            dep_score = tier_weight * math.log1p(dependents) * math.sqrt(1 + repos / 100)
-            tier_contributions['tier2'] += dep_score
+        # ========== Dependency signals (Tier 2) ==========
+        tier_contributions['tier2'] = tier2_by_server.get(server_name, 0.0)
         
         # ========== Compute raw score ==========
         raw_score = sum(tier_contributions.values())
@@ -1858,33 +1924,26 @@ def compute_backlink_scores(db_path: Path = DATABASE_PATH, token: Optional[str]
     else:
         q99_log_raw = 1.0
 
-    if progress:
+    if ticker:
+        ticker.flush()
         progress.update(score_task_id, description="[bold white]Finalizing scores...", advance=0)
 
+    # One timestamp for the whole batch
+    now_iso = datetime.now(timezone.utc).isoformat()
+
     for server_name, res in server_raw_results.items():
         raw_score = res['raw_score']
         log_raw = math.log1p(raw_score)
         normalized = min(1.0, log_raw / q99_log_raw) if raw_score > 0 else 0.0
         
         # Store edges
-        for edge in res['edges_to_store']:
-            cursor.execute("""
+        if res['edges_to_store']:
+            cursor.executemany("""
                 INSERT OR REPLACE INTO backlink_edges
                 (server_name, referencer_repo, tier, tier_weight, repo_stars, 
                  repo_pushed_at, is_archived, is_fork, edge_score, created_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                edge['server_name'],
-                edge['referencer_repo'],
-                edge['tier'],
-                edge['tier_weight'],
-                edge['repo_stars'],
-                edge['repo_pushed_at'],
-                edge['is_archived'],
-                edge['is_fork'],
-                edge['edge_score'],
-                datetime.now(timezone.utc).isoformat()
-            ))
+            """, [(*edge, now_iso) for edge in res['edges_to_store']])
             
         # Store aggregated score
         cursor.execute("""
@@ -1902,7 +1961,7 @@ def compute_backlink_scores(db_path: Path = DATABASE_PATH, token: Optional[str]
             res['tier_contributions']['tier3'],
             res['tier_contributions']['tier4'],
             res['unique_repos_count'],
-            datetime.now(timezone.utc).isoformat()
+            now_iso
         ))
         
         if raw_score > 0:
@@ -1939,119 +1998,84 @@ def compute_market_rankings(db_path: Path = DATABASE_PATH, progress: Optional[Pr
         print("\nComputing Marketplace Rankings...")
         task_id = None
 
-    # 1. Fetch all raw signals
-    cursor.execute("""
-        SELECT 
-            s.name,
-            s.repository_url,
-            COALESCE(bs.raw_score, 0) as usage_raw,
-            COALESCE(gs.stars, 0) as stars,
-            COALESCE(gs.forks, 0) as forks,
-            gs.last_push,
-            COALESCE(pd.downloads_last_week, 0) as downloads,
-            (SELECT COUNT(*) FROM environment_variables ev WHERE ev.server_name = s.name AND ev.is_secret = 1) as auth_count,
-            gs.repo_owner
-        FROM servers s
-        LEFT JOIN backlink_scores bs ON s.name = bs.server_name
-        LEFT JOIN github_signals gs ON s.name = gs.server_name
-        LEFT JOIN (
-            SELECT server_name, SUM(downloads_last_week) as downloads_last_week
-            FROM package_downloads
-            GROUP BY server_name
-        ) pd ON s.name = pd.server_name
-    """)
-    rows = cursor.fetchall()
-    
+    cursor.execute("SELECT COUNT(*) FROM servers")
+    total = cursor.fetchone()[0]
     if progress:
-        progress.update(task_id, total=len(rows))
-
-    raw_data = []
-    u_vals, r_vals, c_vals = [], [], []
-    
-    for r in rows:
-        # Pillar 1: Usage (Backlinks)
-        u_raw = math.log1p(r['usage_raw'])
-        u_vals.append(u_raw)
-        
-        # Pillar 2: Reputation (Stars/Forks)
-        # Note: using log10 per user suggestion
-        rep_raw = math.log10(1 + r['stars']) + math.log10(1 + r['forks'])
-        r_vals.append(rep_raw)
-        
-        # Pillar 3: Activity (Freshness) - Already bounded 0-1
-        now = datetime.now(timezone.utc)
-        pushed_at = r['last_push']
-        if pushed_at:
-            try:
-                p_date = datetime.fromisoformat(pushed_at.replace('Z', '+00:00'))
-                years_ago = (now - p_date).days / 365.0
-                activity = math.exp(-0.5 * years_ago)
-            except:
-                activity = 0.5
-        else:
-            activity = 0.5
-            
-        # Pillar 4: Reach (Downloads)
-        reach_raw = math.log10(1 + r['downloads'])
-        c_vals.append(reach_raw)
-        
-        raw_data.append({
-            'name': r['name'],
-            'u_raw': u_raw,
-            'r_raw': rep_raw,
-            'activity': activity,
-            'c_raw': reach_raw,
-            'is_zero_auth': r['auth_count'] == 0,
-            'is_verified': (r['repo_owner'] or '').lower() in TRUSTED_ORGS
-        })
-
-    # Calculate 99th percentiles for normalization
-    def get_q99(vals):
-        if not vals: return 1.0
-        sorted_v = sorted(vals)
-        return max(sorted_v[int(len(sorted_v) * 0.99)], 1e-6)
-
-    q99_u = get_q99(u_vals)
-    q99_r = get_q99(r_vals)
-    q99_c = get_q99(c_vals)
-
-    # 2. Normalize and compute final scores
-    for d in raw_data:
-        # Normalize pillars to [0, 1]
-        u_norm = min(1.0, d['u_raw'] / q99_u)
-        r_norm = min(1.0, d['r_raw'] / q99_r)
-        a_norm = d['activity']
-        c_norm = min(1.0, d['c_raw'] / q99_c)
-        
-        # Weighted sum: 0.45U + 0.30R + 0.15A + 0.10C
-        composite = (0.45 * u_norm) + (0.30 * r_norm) + (0.15 * a_norm) + (0.10 * c_norm)
-        
-        # Additive bonuses
-        if d['is_zero_auth']:
-            composite += 0.05
-        if d['is_verified']:
-            composite += 0.10
-            
-        final_score = max(0.0, min(1.0, composite))
-        
-        cursor.execute("""
-            INSERT OR REPLACE INTO market_rankings
-            (server_name, total_score, usage_score, reputation_score, activity_score, reach_score, is_zero_auth, is_verified, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            d['name'],
-            final_score,
+        progress.update(task_id, total=total)
+
+    # Pillars, 99th-percentile normalization and the composite score are all
+    # computed in one statement so no row ever round-trips through Python.
+    #   U = log1p(backlink raw score)        R = log10(1+stars) + log10(1+forks)
+    #   A = exp(-0.5 * years since push)     C = log10(1+weekly downloads)
+    # q99 is the value at index int(n * 0.99) of the sorted pillar column.
+    trusted = sorted(TRUSTED_ORGS)
+    trusted_placeholders = ','.join('?' * len(trusted))
+    cursor.execute(f"""
+        WITH signals AS MATERIALIZED (
+            SELECT 
+                s.name,
+                log1p(COALESCE(bs.raw_score, 0)) as u_raw,
+                log10(1 + COALESCE(gs.stars, 0)) + log10(1 + COALESCE(gs.forks, 0)) as r_raw,
+                COALESCE(
+                    exp(-0.5 * CAST(julianday('now') - julianday(gs.last_push) AS INTEGER) / 365.0),
+                    0.5
+                ) as activity,
+                log10(1 + COALESCE(pd.downloads_last_week, 0)) as c_raw,
+                NOT EXISTS (
+                    SELECT 1 FROM environment_variables ev 
+                    WHERE ev.server_name = s.name AND ev.is_secret = 1
+                ) as is_zero_auth,
+                LOWER(COALESCE(gs.repo_owner, '')) IN ({trusted_placeholders}) as is_verified
+            FROM servers s
+            LEFT JOIN backlink_scores bs ON s.name = bs.server_name
+            LEFT JOIN github_signals gs ON s.name = gs.server_name
+            LEFT JOIN (
+                SELECT server_name, SUM(downloads_last_week) as downloads_last_week
+                FROM package_downloads
+                GROUP BY server_name
+            ) pd ON s.name = pd.server_name
+        ),
+        q99_idx AS (
+            SELECT CAST(COUNT(*) * 0.99 AS INTEGER) as idx FROM signals
+        ),
+        q99 AS (
+            SELECT
+                MAX((SELECT u_raw FROM signals ORDER BY u_raw LIMIT 1 OFFSET (SELECT idx FROM q99_idx)), 1e-6) as u,
+                MAX((SELECT r_raw FROM signals ORDER BY r_raw LIMIT 1 OFFSET (SELECT idx FROM q99_idx)), 1e-6) as r,
+                MAX((SELECT c_raw FROM signals ORDER BY c_raw LIMIT 1 OFFSET (SELECT idx FROM q99_idx)), 1e-6) as c
+        ),
+        normalized AS (
+            SELECT 
+                sg.name,
+                MIN(1.0, sg.u_raw / q99.u) as u_norm,
+                MIN(1.0, sg.r_raw / q99.r) as r_norm,
+                sg.activity as a_norm,
+                MIN(1.0, sg.c_raw / q99.c) as c_norm,
+                sg.is_zero_auth,
+                sg.is_verified
+            FROM signals sg, q99
+        )
+        INSERT OR REPLACE INTO market_rankings
+        (server_name, total_score, usage_score, reputation_score, activity_score, reach_score, is_zero_auth, is_verified, updated_at)
+        SELECT 
+            name,
+            -- Weighted sum 0.45U + 0.30R + 0.15A + 0.10C plus additive bonuses, clamped to [0, 1]
+            MAX(0.0, MIN(1.0,
+                0.45 * u_norm + 0.30 * r_norm + 0.15 * a_norm + 0.10 * c_norm
+                + 0.05 * is_zero_auth + 0.10 * is_verified
+            )),
             u_norm,
             r_norm,
             a_norm,
             c_norm,
-            1 if d['is_zero_auth'] else 0,
-            1 if d['is_verified'] else 0,
-            datetime.now(timezone.utc).isoformat()
-        ))
-        
-        if progress:
-            progress.update(task_id, advance=1, description=f"[bold gold1]Ranking: {d['name']}")
+            is_zero_auth,
+            is_verified,
+            ?
+        FROM normalized
+    """, (*trusted, datetime.now(timezone.utc).isoformat()))
+    
+    if progress:
+        progress.update(task_id, completed=total)
 
     conn.commit()
     conn.close()
@@ -2391,13 +2415,27 @@ def main():
         db = Path(args.db)
         skip = not args.clean
         with progress:
-            enrich_github(db, limit=args.limit, skip_failures=skip, progress=progress, query=args.query)
-            enrich_npm(db, limit=args.limit, skip_failures=skip, progress=progress, query=args.query)
-            enrich_pypi(db, limit=args.limit, skip_failures=skip, progress=progress, query=args.query)
-            enrich_docker(db, limit=args.limit, skip_failures=skip, progress=progress, query=args.query)
-            enrich_glama(db, progress=progress, query=args.query)
-            analyze_service_costs(db, progress=progress, query=args.query)
-            enrich_dependents(db, limit=args.limit, skip_failures=skip, progress=progress, query=args.query)
+            # Per-source enrichers hit different external APIs and write disjoint
+            # rows, so they run side by side, each on its own connection (WAL).
+            # One thread per source: each keeps its own sequential pacing, so
+            # per-provider rate limits are respected and wall-clock is the max,
+            # not the sum, of the individual runs.
+            jobs = [
+                (enrich_github, dict(limit=args.limit, skip_failures=skip)),
+                (enrich_npm, dict(limit=args.limit, skip_failures=skip)),
+                (enrich_pypi, dict(limit=args.limit, skip_failures=skip)),
+                (enrich_docker, dict(limit=args.limit, skip_failures=skip)),
+                (enrich_glama, {}),
+                (analyze_service_costs, {}),
+                (enrich_dependents, dict(limit=args.limit, skip_failures=skip)),
+            ]
+            with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+                futures = [
+                    executor.submit(func, db, progress=progress, query=args.query, **kwargs)
+                    for func, kwargs in jobs
+                ]
+                for future in as_completed(futures):
+                    future.result()
             # Note: config-refs and compute-scores not in 'all' due to rate limit usage
         show_enrichment_stats(db)
     elif args.command == "stats":
@@ -7,18 +7,57 @@ Uses the shared db.py schema.
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
-from datetime import datetime
+import zlib
+from datetime import datetime, timezone
 from typing import Optional, Generator
 from pathlib import Path
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 
 from db import DATABASE_PATH, init_database
 
+# orjson is optional - much faster JSON encoding/decoding on the extract hot path
+try:
+    import orjson
+    json_loads = orjson.loads
+    
+    def json_dumps_bytes(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    json_loads = json.loads
+    
+    def json_dumps_bytes(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def json_dumps(obj) -> str:
+    """Serialize to compact JSON text for TEXT columns."""
+    return json_dumps_bytes(obj).decode("utf-8")
+
 
 # Constants
 MCP_REGISTRY_BASE_URL = "https://registry.modelcontextprotocol.io/v0.1"
 DEFAULT_LIMIT = 100  # Max allowed by API
+BATCH_SIZE = 128  # Servers written per transaction
+
+# One keep-alive session for all registry pages, retrying transient failures
+_SESSION = requests.Session()
+_SESSION.headers.update({"Accept": "application/json", "User-Agent": "wisp-extract/1.0"})
+_SESSION.mount("https://", HTTPAdapter(
+    pool_maxsize=4,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504))
+))
+
+
+def _fetch_page(params: dict) -> dict:
+    """Fetch a single page of servers from the registry."""
+    response = _SESSION.get(f"{MCP_REGISTRY_BASE_URL}/servers", params=params)
+    response.raise_for_status()
+    return json_loads(response.content)
 
 
 def fetch_servers(
@@ -29,196 +68,316 @@ def fetch_servers(
     """
     Fetch all servers from the MCP Registry with pagination.
     
-    Yields each server entry as a dictionary.
+    Yields each server entry as a dictionary. The next page is requested in a
+    background thread as soon as its cursor is known, so network round trips
+    overlap with the caller persisting the current page.
+    
+    Pages are decoded whole rather than streamed: the cursor for the next page
+    lives in the page metadata, and a page is capped at DEFAULT_LIMIT entries.
     """
-    cursor = None
+    base_params = {"limit": limit}
+    if search:
+        base_params["search"] = search
+    if version:
+        base_params["version"] = version
+    
     total_fetched = 0
     
-    while True:
-        params = {"limit": limit}
-        if cursor:
-            params["cursor"] = cursor
-        if search:
-            params["search"] = search
-        if version:
-            params["version"] = version
-            
-        response = requests.get(
-            f"{MCP_REGISTRY_BASE_URL}/servers",
-            params=params,
-            headers={"Accept": "application/json"}
-        )
-        response.raise_for_status()
-        
-        data = response.json()
-        servers = data.get("servers", [])
-        metadata = data.get("metadata", {})
-        
-        for server in servers:
-            yield server
-            total_fetched += 1
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = executor.submit(_fetch_page, base_params)
         
-        print(f"  Fetched {total_fetched} servers so far...")
-        
-        # Check for next page
-        cursor = metadata.get("nextCursor")
-        if not cursor or not servers:
-            break
+        while pending is not None:
+            data = pending.result()
+            servers = data.get("servers", [])
+            metadata = data.get("metadata", {})
+            
+            # Kick off the next page before handing this one to the caller
+            cursor = metadata.get("nextCursor")
+            if cursor and servers:
+                pending = executor.submit(_fetch_page, {**base_params, "cursor": cursor})
+            else:
+                pending = None
+            
+            for server in servers:
+                yield server
+                total_fetched += 1
+            
+            print(f"  Fetched {total_fetched} servers so far...")
     
     print(f"Total servers fetched: {total_fetched}")
 
 
 def extract_server_data(server_entry: dict) -> dict:
-    """Extract relevant fields from a server entry."""
-    meta = server_entry.get("_meta", {})
-    registry_meta = meta.get("io.modelcontextprotocol.registry/official", {})
-    server = server_entry.get("server", {})
-    repository = server.get("repository", {})
+    """
+    Extract relevant fields from a server entry.
+    
+    The entry itself is kept as-is under "raw_entry"; it is serialized for the
+    raw_json column only when the batch is written.
+    """
+    meta = server_entry.get("_meta") or {}
+    registry_meta = meta.get("io.modelcontextprotocol.registry/official") or {}
+    server = server_entry.get("server") or {}
+    repository = server.get("repository") or {}
+    get = server.get
     
     return {
-        "name": server.get("name", ""),
-        "description": server.get("description", ""),
-        "version": server.get("version", ""),
-        "schema_url": server.get("$schema", ""),
-        "repository_url": repository.get("url", ""),
-        "repository_source": repository.get("source", ""),
-        "website_url": server.get("websiteUrl", ""),
+        "name": get("name") or "",
+        "description": get("description") or "",
+        "version": get("version") or "",
+        "schema_url": get("$schema") or "",
+        "repository_url": repository.get("url") or "",
+        "repository_source": repository.get("source") or "",
+        "website_url": get("websiteUrl") or "",
         "is_latest": registry_meta.get("isLatest", False),
-        "status": registry_meta.get("status", ""),
+        "status": registry_meta.get("status") or "",
         "published_at": registry_meta.get("publishedAt"),
         "updated_at": registry_meta.get("updatedAt"),
-        "icons": server.get("icons", []),
-        "packages": server.get("packages", []),
-        "remotes": server.get("remotes", []),
-        "raw_json": json.dumps(server_entry)
+        "icons": get("icons") or [],
+        "packages": get("packages") or [],
+        "remotes": get("remotes") or [],
+        "raw_entry": server_entry
     }
 
 
-def save_server(conn, server_data: dict):
-    """Save a server and its related data to the database."""
-    cursor = conn.cursor()
-    server_name = server_data["name"]
-    
-    # Insert or update main server record
-    cursor.execute("""
-        INSERT OR REPLACE INTO servers 
-        (name, description, version, schema_url, repository_url, repository_source,
-         website_url, is_latest, status, published_at, updated_at, raw_json, extracted_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+# Prepared once and reused by every batch
+_SERVER_INSERT_SQL = """
+    INSERT OR REPLACE INTO servers 
+    (name, description, version, schema_url, repository_url, repository_source,
+     website_url, is_latest, status, published_at, updated_at, raw_json, extracted_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_ICON_INSERT_SQL = """
+    INSERT INTO server_icons (server_name, src, mime_type, theme, sizes)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+_PACKAGE_INSERT_SQL = """
+    INSERT INTO server_packages 
+    (server_name, registry_type, identifier, version, transport_type, 
+     transport_url, runtime_hint, file_sha256, raw_json)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_ENV_VAR_INSERT_SQL = """
+    INSERT INTO environment_variables 
+    (server_name, var_name, description, is_required, is_secret, 
+     format, default_value, choices)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_REMOTE_INSERT_SQL = """
+    INSERT INTO server_remotes (server_name, transport_type, url, headers_json)
+    VALUES (?, ?, ?, ?)
+"""
+
+
+
+# Row packers: map one registry JSON object to its child-table row tuple, in
+# the column order of the matching INSERT above
+
+def _pack_icon(server_name: str, icon: dict) -> tuple:
+    get = icon.get
+    return (
         server_name,
-        server_data["description"],
-        server_data["version"],
-        server_data["schema_url"],
-        server_data["repository_url"],
-        server_data["repository_source"],
-        server_data["website_url"],
-        server_data["is_latest"],
-        server_data["status"],
-        server_data["published_at"],
-        server_data["updated_at"],
-        server_data["raw_json"],
-        datetime.utcnow().isoformat()
-    ))
-    
-    # Clear existing related data for this server
-    cursor.execute("DELETE FROM server_icons WHERE server_name = ?", (server_name,))
-    cursor.execute("DELETE FROM server_packages WHERE server_name = ?", (server_name,))
-    cursor.execute("DELETE FROM server_remotes WHERE server_name = ?", (server_name,))
-    cursor.execute("DELETE FROM environment_variables WHERE server_name = ?", (server_name,))
-    
-    # Insert icons
-    for icon in server_data.get("icons", []):
-        cursor.execute("""
-            INSERT INTO server_icons (server_name, src, mime_type, theme, sizes)
-            VALUES (?, ?, ?, ?, ?)
-        """, (
-            server_name,
-            icon.get("src", ""),
-            icon.get("mimeType", ""),
-            icon.get("theme", ""),
-            json.dumps(icon.get("sizes", []))
-        ))
+        get("src", ""),
+        get("mimeType", ""),
+        get("theme", ""),
+        json_dumps(get("sizes", []))
+    )
+
+
+def _pack_package(server_name: str, package: dict) -> tuple:
+    get = package.get
+    transport = get("transport", {})
+    return (
+        server_name,
+        get("registryType", ""),
+        get("identifier", ""),
+        get("version", ""),
+        transport.get("type", ""),
+        transport.get("url", ""),
+        get("runtimeHint", ""),
+        get("fileSha256", ""),
+        json_dumps(package)
+    )
+
+
+def _pack_env_var(server_name: str, env_var: dict) -> tuple:
+    get = env_var.get
+    return (
+        server_name,
+        get("name", ""),
+        get("description", ""),
+        get("isRequired", False),
+        get("isSecret", False),
+        get("format", ""),
+        get("default", ""),
+        json_dumps(get("choices", []))
+    )
+
+
+def _pack_remote(server_name: str, remote: dict) -> tuple:
+    get = remote.get
+    headers = get("headers", [])
+    return (
+        server_name,
+        get("type", ""),
+        get("url", ""),
+        json_dumps(headers) if headers else None
+    )
+
+
+def _utc_now() -> str:
+    """Current UTC time as an ISO-8601 string (second precision)."""
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def save_servers(conn, batch: list[dict], extracted_at: Optional[str] = None):
+    """
+    Save a batch of servers and their related data to the database.
+    
+    extracted_at is normally computed once per run by the caller.
+    """
+    if not batch:
+        return
+    
+    # Last entry wins if the registry returns the same server twice in a batch
+    batch = list({server_data["name"]: server_data for server_data in batch}.values())
+    
+    cursor = conn.cursor()
+    extracted_at = extracted_at or _utc_now()
+    
+    server_rows = []
+    icon_rows = []
+    package_rows = []
+    env_var_rows = []
+    remote_rows = []
     
-    # Insert packages and environment variables
-    for package in server_data.get("packages", []):
-        transport = package.get("transport", {})
+    for server_data in batch:
+        server_name = server_data["name"]
         
-        cursor.execute("""
-            INSERT INTO server_packages 
-            (server_name, registry_type, identifier, version, transport_type, 
-             transport_url, runtime_hint, file_sha256, raw_json)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+        server_rows.append((
             server_name,
-            package.get("registryType", ""),
-            package.get("identifier", ""),
-            package.get("version", ""),
-            transport.get("type", ""),
-            transport.get("url", ""),
-            package.get("runtimeHint", ""),
-            package.get("fileSha256", ""),
-            json.dumps(package)
+            server_data["description"],
+            server_data["version"],
+            server_data["schema_url"],
+            server_data["repository_url"],
+            server_data["repository_source"],
+            server_data["website_url"],
+            server_data["is_latest"],
+            server_data["status"],
+            server_data["published_at"],
+            server_data["updated_at"],
+            zlib.compress(json_dumps_bytes(server_data["raw_entry"]), 1),
+            extracted_at
         ))
         
-        # Extract environment variables from packages
-        for env_var in package.get("environmentVariables", []):
-            cursor.execute("""
-                INSERT INTO environment_variables 
-                (server_name, var_name, description, is_required, is_secret, 
-                 format, default_value, choices)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                server_name,
-                env_var.get("name", ""),
-                env_var.get("description", ""),
-                env_var.get("isRequired", False),
-                env_var.get("isSecret", False),
-                env_var.get("format", ""),
-                env_var.get("default", ""),
-                json.dumps(env_var.get("choices", []))
-            ))
-    
-    # Insert remotes
-    for remote in server_data.get("remotes", []):
-        headers = remote.get("headers", [])
-        cursor.execute("""
-            INSERT INTO server_remotes (server_name, transport_type, url, headers_json)
-            VALUES (?, ?, ?, ?)
-        """, (
-            server_name,
-            remote.get("type", ""),
-            remote.get("url", ""),
-            json.dumps(headers) if headers else None
-        ))
+        icon_rows.extend(map(_pack_icon, repeat(server_name), server_data["icons"]))
+        remote_rows.extend(map(_pack_remote, repeat(server_name), server_data["remotes"]))
+        
+        packages = server_data["packages"]
+        package_rows.extend(map(_pack_package, repeat(server_name), packages))
+        for package in packages:
+            # Extract environment variables from packages
+            env_var_rows.extend(map(_pack_env_var, repeat(server_name), package.get("environmentVariables", [])))
+    
+    # Insert or update main server records. Replacing an existing row deletes
+    # it first, and ON DELETE CASCADE clears its icons, packages, remotes and
+    # environment variables, so no explicit child DELETEs are needed
+    cursor.executemany(_SERVER_INSERT_SQL, server_rows)
+    
+    if icon_rows:
+        cursor.executemany(_ICON_INSERT_SQL, icon_rows)
+    if package_rows:
+        cursor.executemany(_PACKAGE_INSERT_SQL, package_rows)
+    if env_var_rows:
+        cursor.executemany(_ENV_VAR_INSERT_SQL, env_var_rows)
+    if remote_rows:
+        cursor.executemany(_REMOTE_INSERT_SQL, remote_rows)
+
+
+def save_server(conn, server_data: dict, extracted_at: Optional[str] = None):
+    """Save a server and its related data to the database."""
+    save_servers(conn, [server_data], extracted_at)
 
 
-def extract_all(db_path: Path = DATABASE_PATH, search: Optional[str] = None):
-    """Extract all servers from the registry and save to database."""
+def _flush(conn, batch: list[dict], extracted_at: str):
+    """Write a batch of servers in a single write transaction."""
+    if not batch:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        save_servers(conn, batch, extracted_at)
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def extract_all(
+    db_path: Path = DATABASE_PATH,
+    search: Optional[str] = None,
+    batch_size: int = BATCH_SIZE,
+    full: bool = False
+):
+    """
+    Extract all servers from the registry and save to database.
+    
+    Servers whose registry updated_at matches the stored row are skipped
+    unless full is True.
+    """
     print(f"Creating/connecting to database: {db_path}")
     conn = init_database(db_path)
     
+    # Registry timestamp of every stored server, for incremental re-runs
+    existing = {} if full else {
+        row["name"]: row["updated_at"]
+        for row in conn.execute("SELECT name, updated_at FROM servers")
+    }
+    conn.commit()
+    
+    # Manage transactions explicitly: servers are buffered and each full batch
+    # is written in one BEGIN IMMEDIATE/COMMIT, so the write lock is never held
+    # across a network fetch and the WAL sync cost is amortized
+    conn.isolation_level = None
+    
     print("Fetching servers from MCP Registry...")
+    extracted_at = _utc_now()
     server_count = 0
+    unchanged = 0
+    batch = []
     
-    for server_entry in fetch_servers(search=search, version="latest"):
-        server_data = extract_server_data(server_entry)
-        save_server(conn, server_data)
-        server_count += 1
-    
-    conn.commit()
-    conn.close()
+    try:
+        for server_entry in fetch_servers(search=search, version="latest"):
+            server_data = extract_server_data(server_entry)
+            server_count += 1
+            
+            updated_at = server_data["updated_at"]
+            if updated_at is not None and existing.get(server_data["name"]) == updated_at:
+                unchanged += 1
+                continue
+            
+            batch.append(server_data)
+            if len(batch) >= batch_size:
+                _flush(conn, batch, extracted_at)
+                batch = []
+        
+        _flush(conn, batch, extracted_at)
+    finally:
+        conn.close()
     
-    print(f"\n✓ Successfully extracted {server_count} servers to {db_path}")
+    print(f"\n✓ Successfully extracted {server_count} servers to {db_path} ({unchanged} unchanged, skipped)")
 
 
 def main():
     parser = argparse.ArgumentParser(description="MCP Registry Data Extractor")
     parser.add_argument("--search", type=str, help="Search filter for server names")
     parser.add_argument("--db", type=str, default=str(DATABASE_PATH), help="Database path")
+    parser.add_argument("--full", action="store_true", help="Rewrite every server, even if unchanged in the registry")
     
     args = parser.parse_args()
-    extract_all(Path(args.db), search=args.search)
+    extract_all(Path(args.db), search=args.search, full=args.full)
 
 
 if __name__ == "__main__":
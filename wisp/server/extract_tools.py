@@ -30,6 +30,7 @@ try:
         MCP_SDK_AVAILABLE,
         extract_all_tools,
         show_extraction_stats,
+        count_connectable_servers,
         get_connectable_servers,
         extract_from_server,
         init_database
@@ -44,26 +45,36 @@ except ImportError as e:
 def list_servers(db_path: Path, include_auth: bool = False, show_all: bool = True):
     """List all connectable servers."""
     conn = get_connection(db_path)
-    servers = get_connectable_servers(conn, skip_auth=not include_auth, skip_extracted=False)
     
-    remote = [s for s in servers if s.get('connection_method') == 'remote']
-    stdio = [s for s in servers if s.get('connection_method') == 'stdio']
+    # Counts and previews share get_connectable_servers' candidate SQL; the
+    # full server list is never materialized
+    skip_auth = not include_auth
+    remote_count, stdio_count, local_count = (
+        count_connectable_servers(conn, skip_auth=skip_auth, skip_extracted=False, connection_methods=(m,))
+        for m in ('remote', 'stdio', 'local')
+    )
     
-    print(f"\n🌐 Remote servers: {len(remote)}")
-    for s in remote[:20]:
-        auth = "🔒" if s.get('requires_auth') else "🔓"
-        url = s.get('url', '')[:50]
+    print(f"\n🌐 Remote servers: {remote_count}")
+    remote = get_connectable_servers(
+        conn, skip_auth=skip_auth, skip_extracted=False, connection_methods=('remote',), limit=20
+    )
+    for s in remote:
+        auth = "🔒" if s['requires_auth'] else "🔓"
+        url = (s['url'] or '')[:50]
         print(f"   {auth} {s['name']}: {url}...")
-    if len(remote) > 20:
-        print(f"   ... and {len(remote) - 20} more")
+    if remote_count > 20:
+        print(f"   ... and {remote_count - 20} more")
     
-    print(f"\n💻 Stdio servers: {len(stdio)}")
-    for s in stdio[:10]:
-        print(f"   • {s['name']}: {s.get('registry_type', '')}:{s.get('identifier', '')}")
-    if len(stdio) > 10:
-        print(f"   ... and {len(stdio) - 10} more")
+    print(f"\n💻 Stdio servers: {stdio_count}")
+    stdio = get_connectable_servers(
+        conn, skip_auth=skip_auth, skip_extracted=False, connection_methods=('stdio',), limit=10
+    )
+    for s in stdio:
+        print(f"   • {s['name']}: {s['registry_type'] or ''}:{s['identifier'] or ''}")
+    if stdio_count > 10:
+        print(f"   ... and {stdio_count - 10} more")
     
-    print(f"\n📊 Total: {len(servers)} connectable servers")
+    print(f"\n📊 Total: {remote_count + stdio_count + local_count} connectable servers")
     conn.close()
 
 
@@ -75,7 +86,9 @@ async def run_extraction(
     skip_auth: bool = False,
     skip_extracted: bool = True,
     timeout: int = 30,
-    query: str = None
+    query: str = None,
+    concurrency: int = 16,
+    max_age: int = None
 ):
     """Run the extraction process."""
     if not MCP_SDK_AVAILABLE:
@@ -91,7 +104,7 @@ async def run_extraction(
         include_stdio = False
         server_type = "Remote only"
     elif local_only:
-        include_stdio = True  # Will filter after
+        include_stdio = True
         server_type = "Local (stdio) only"
     else:
         include_stdio = True
@@ -102,8 +115,11 @@ async def run_extraction(
     print(f"Server types: {server_type}")
     print(f"Auth servers: {'Skipped' if skip_auth else 'Included'}")
     print(f"Skip already done: {'Yes' if skip_extracted else 'No (--clean)'}")
+    if max_age is not None:
+        print(f"Skip fresh successes: within {max_age}s")
     print(f"Limit: {limit if limit else 'All'}")
     print(f"Timeout: {timeout}s")
+    print(f"Concurrency: {concurrency}")
     print(f"=" * 50)
     
     await extract_all_tools(
@@ -113,7 +129,10 @@ async def run_extraction(
         skip_auth=skip_auth,
         skip_extracted=skip_extracted,
         timeout=timeout,
-        query=query
+        query=query,
+        concurrency=concurrency,
+        max_age=max_age,
+        local_only=local_only
     )
 
 
@@ -158,6 +177,8 @@ Examples:
                         help="Connection timeout in seconds (default: 30)")
     parser.add_argument("--query", type=str, default=None,
                         help="Filter servers by name (substring match)")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="Max servers to connect to at once (default: 16)")
     
     # Server type options (mutually exclusive)
     type_group = parser.add_mutually_exclusive_group()
@@ -171,6 +192,8 @@ Examples:
                         help="Skip servers that require authentication")
     parser.add_argument("--clean", action="store_true",
                         help="Re-extract all servers, ignoring previously extracted")
+    parser.add_argument("--max-age", type=int, default=None,
+                        help="Skip servers successfully extracted within this many seconds (useful with --clean)")
     
     args = parser.parse_args()
     db_path = Path(args.db)
@@ -193,7 +216,9 @@ Examples:
         skip_auth=args.skip_auth,
         skip_extracted=not args.clean,
         timeout=args.timeout,
-        query=args.query
+        query=args.query,
+        concurrency=args.concurrency,
+        max_age=args.max_age
     ))
 
 
@@ -12,12 +12,16 @@ Uses the official MCP Python SDK for proper protocol compliance.
 import asyncio
 import json
 import os
+import re
+import shutil
 import subprocess
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, Dict, Any, List, Tuple
 import argparse
+from contextlib import nullcontext
 from dotenv import load_dotenv
 
 # Load environment variables from .env in the same directory
@@ -36,101 +40,144 @@ except ImportError:
 from db import DATABASE_PATH, get_connection, init_database
 
 
-def save_tools(conn, server_name: str, tools: List[Dict]):
+# Pre-encoded empty containers; many tools have no schema and many prompts no arguments
+_EMPTY_OBJ = "{}"
+_EMPTY_ARR = "[]"
+
+# Encoded parameter defaults/enums; the same few values recur across many tools
+_DUMPS_CACHE: Dict[Any, str] = {}
+_DUMPS_CACHE_MAX = 4096
+# Floats are left out: 0.0 and -0.0 compare equal but encode differently
+_SCALAR_TYPES = (str, int, bool, type(None))
+
+
+def _fast_dumps(value: Any) -> str:
+    """json.dumps with memoization for scalars and flat lists of scalars."""
+    if isinstance(value, _SCALAR_TYPES):
+        key = (type(value), value)
+    elif isinstance(value, list) and all(isinstance(v, _SCALAR_TYPES) for v in value):
+        # Element types are part of the key so [1] and [True] don't collide
+        key = (list, tuple((type(v), v) for v in value))
+    else:
+        return json.dumps(value)
+    
+    encoded = _DUMPS_CACHE.get(key)
+    if encoded is None:
+        encoded = json.dumps(value)
+        if len(_DUMPS_CACHE) < _DUMPS_CACHE_MAX:
+            _DUMPS_CACHE[key] = encoded
+    return encoded
+
+
+def _transaction(conn, commit: bool):
+    """Own the transaction when commit is True, else join the caller's."""
+    return conn if commit else nullcontext()
+
+
+def save_tools(conn, server_name: str, tools: List[Dict], commit: bool = True, now: Optional[str] = None):
     """Save extracted tools to database."""
-    cursor = conn.cursor()
+    now = now or datetime.utcnow().isoformat()
+    
+    # Last definition wins if a server lists the same tool name twice
+    tools = list({tool.get('name', ''): tool for tool in tools}.values())
     
+    tool_rows = []
+    param_rows = []
     for tool in tools:
         tool_name = tool.get('name', '')
-        title = tool.get('title', '')
-        description = tool.get('description', '')
-        input_schema = json.dumps(tool.get('inputSchema', {}))
-        output_schema = json.dumps(tool.get('outputSchema', {})) if tool.get('outputSchema') else None
+        schema = tool.get('inputSchema') or {}
+        output_schema = tool.get('outputSchema')
         
-        cursor.execute("""
-            INSERT OR REPLACE INTO tools 
-            (server_name, tool_name, title, description, input_schema, output_schema, extracted_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
+        tool_rows.append((
             server_name,
             tool_name,
-            title,
-            description,
-            input_schema,
-            output_schema,
-            datetime.utcnow().isoformat()
+            tool.get('title', ''),
+            tool.get('description', ''),
+            json.dumps(schema) if schema else _EMPTY_OBJ,
+            json.dumps(output_schema) if output_schema else None,
+            now
         ))
         
-        # Extract and save parameters
-        schema = tool.get('inputSchema', {})
+        # Extract parameters
         properties = schema.get('properties', {})
         required = schema.get('required', [])
-        
-        # Clear existing parameters for this tool
-        cursor.execute(
-            "DELETE FROM tool_parameters WHERE server_name = ? AND tool_name = ?",
-            (server_name, tool_name)
-        )
-        
         for param_name, param_info in properties.items():
-            cursor.execute("""
-                INSERT INTO tool_parameters 
-                (server_name, tool_name, param_name, param_type, description, 
-                 is_required, default_value, enum_values)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+            param_rows.append((
                 server_name,
                 tool_name,
                 param_name,
                 param_info.get('type', ''),
                 param_info.get('description', ''),
                 param_name in required,
-                json.dumps(param_info.get('default')) if 'default' in param_info else None,
-                json.dumps(param_info.get('enum')) if 'enum' in param_info else None
+                _fast_dumps(param_info['default']) if 'default' in param_info else None,
+                _fast_dumps(param_info['enum']) if 'enum' in param_info else None
             ))
     
-    conn.commit()
+    with _transaction(conn, commit):
+        cursor = conn.cursor()
+        cursor.executemany("""
+            INSERT OR REPLACE INTO tools 
+            (server_name, tool_name, title, description, input_schema, output_schema, extracted_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, tool_rows)
+        
+        # Clear existing parameters for these tools
+        cursor.executemany(
+            "DELETE FROM tool_parameters WHERE server_name = ? AND tool_name = ?",
+            [(server_name, row[1]) for row in tool_rows]
+        )
+        
+        cursor.executemany("""
+            INSERT INTO tool_parameters 
+            (server_name, tool_name, param_name, param_type, description, 
+             is_required, default_value, enum_values)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, param_rows)
 
 
-def save_resources(conn, server_name: str, resources: List[Dict]):
+def save_resources(conn, server_name: str, resources: List[Dict], commit: bool = True, now: Optional[str] = None):
     """Save extracted resources to database."""
-    cursor = conn.cursor()
+    now = now or datetime.utcnow().isoformat()
     
-    for resource in resources:
-        cursor.execute("""
+    with _transaction(conn, commit):
+        conn.executemany("""
             INSERT OR REPLACE INTO resources 
             (server_name, uri, name, description, mime_type, extracted_at)
             VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            server_name,
-            str(resource.get('uri', '')),
-            resource.get('name', ''),
-            resource.get('description', ''),
-            resource.get('mimeType', ''),
-            datetime.utcnow().isoformat()
-        ))
-    
-    conn.commit()
+        """, [
+            (
+                server_name,
+                str(resource.get('uri', '')),
+                resource.get('name', ''),
+                resource.get('description', ''),
+                resource.get('mimeType', ''),
+                now
+            )
+            for resource in resources
+        ])
 
 
-def save_prompts(conn, server_name: str, prompts: List[Dict]):
+def save_prompts(conn, server_name: str, prompts: List[Dict], commit: bool = True, now: Optional[str] = None):
     """Save extracted prompts to database."""
-    cursor = conn.cursor()
+    now = now or datetime.utcnow().isoformat()
     
+    rows = []
     for prompt in prompts:
-        cursor.execute("""
-            INSERT OR REPLACE INTO prompts 
-            (server_name, prompt_name, description, arguments_json, extracted_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (
+        arguments = prompt.get('arguments', [])
+        rows.append((
             server_name,
             prompt.get('name', ''),
             prompt.get('description', ''),
-            json.dumps(prompt.get('arguments', [])),
-            datetime.utcnow().isoformat()
+            _EMPTY_ARR if arguments == [] else json.dumps(arguments),
+            now
         ))
     
-    conn.commit()
+    with _transaction(conn, commit):
+        conn.executemany("""
+            INSERT OR REPLACE INTO prompts 
+            (server_name, prompt_name, description, arguments_json, extracted_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows)
 
 
 def log_connection(
@@ -142,27 +189,80 @@ def log_connection(
     error_message: Optional[str] = None,
     tools_count: int = 0,
     resources_count: int = 0,
-    prompts_count: int = 0
+    prompts_count: int = 0,
+    commit: bool = True,
+    now: Optional[str] = None
 ):
     """Log a connection attempt."""
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO connection_log 
-        (server_name, connection_type, url_or_command, success, error_message, 
-         tools_count, resources_count, prompts_count, attempted_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        server_name,
-        connection_type,
-        url_or_command,
-        success,
-        error_message,
-        tools_count,
-        resources_count,
-        prompts_count,
-        datetime.utcnow().isoformat()
-    ))
-    conn.commit()
+    with _transaction(conn, commit):
+        conn.execute("""
+            INSERT INTO connection_log 
+            (server_name, connection_type, url_or_command, success, error_message, 
+             tools_count, resources_count, prompts_count, attempted_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            server_name,
+            connection_type,
+            url_or_command,
+            success,
+            error_message,
+            tools_count,
+            resources_count,
+            prompts_count,
+            now or datetime.utcnow().isoformat()
+        ))
+
+
+# Failure patterns as (substring, category, reason), checked in priority order:
+# the first substring found in the lower-cased error message decides.
+FAILURE_PATTERNS: Tuple[Tuple[str, str, str], ...] = (
+    # Permanent failures - don't retry
+    ("not found", "permanent", "package_not_found"),
+    ("404", "permanent", "http_404"),
+    ("could not determine executable", "permanent", "no_executable"),
+    ("no such file or directory", "permanent", "file_not_found"),
+    ("package not found", "permanent", "package_not_found"),
+    ("module not found", "permanent", "module_not_found"),
+    ("registry error", "permanent", "registry_error"),
+    ("invalid url", "permanent", "invalid_url"),
+    
+    # Auth required - might work with auth later
+    ("401", "auth_required", "http_401"),
+    ("403", "auth_required", "http_403"),
+    ("unauthorized", "auth_required", "unauthorized"),
+    ("forbidden", "auth_required", "forbidden"),
+    ("authentication required", "auth_required", "auth_required"),
+    
+    # Docker/container issues - environment specific, permanent since Docker isn't set up
+    ("docker", "permanent", "docker_not_running"),
+    ("container", "permanent", "container_error"),
+    ("daemon", "permanent", "daemon_not_running"),
+    
+    # Transient - retry later
+    ("timeout", "transient", "timeout"),
+    ("timed out", "transient", "timeout"),
+    ("connection refused", "transient", "connection_refused"),
+    ("connection reset", "transient", "connection_reset"),
+    ("rate limit", "transient", "rate_limited"),
+    ("500", "transient", "http_500"),
+    ("502", "transient", "http_502"),
+    ("503", "transient", "http_503"),
+    ("504", "transient", "http_504"),
+    ("server error", "transient", "server_error"),
+    
+    # MCP SDK / protocol errors - server implementation is broken, won't fix itself
+    ("taskgroup", "permanent", "mcp_protocol_error"),
+    ("sub-exception", "permanent", "mcp_protocol_error"),
+    ("unhandled errors", "permanent", "mcp_protocol_error"),
+    ("too many values to unpack", "permanent", "mcp_response_error"),
+    ("cannot unpack", "permanent", "mcp_response_error"),
+    ("not enough values", "permanent", "mcp_response_error"),
+    ("unexpected keyword argument", "permanent", "mcp_sdk_error"),
+    ("type error", "permanent", "mcp_type_error"),
+    ("attribute error", "permanent", "mcp_attribute_error"),
+    ("json decode", "permanent", "mcp_invalid_response"),
+    ("invalid json", "permanent", "mcp_invalid_response"),
+)
 
 
 def categorize_failure(error_message: str) -> Tuple[str, str]:
@@ -180,83 +280,9 @@ def categorize_failure(error_message: str) -> Tuple[str, str]:
         return "unknown", "no error message"
     
     error_lower = error_message.lower()
-    
-    # Permanent failures - don't retry
-    permanent_patterns = [
-        ("not found", "package_not_found"),
-        ("404", "http_404"),
-        ("could not determine executable", "no_executable"),
-        ("no such file or directory", "file_not_found"),
-        ("package not found", "package_not_found"),
-        ("module not found", "module_not_found"),
-        ("registry error", "registry_error"),
-        ("invalid url", "invalid_url"),
-    ]
-    
-    for pattern, reason in permanent_patterns:
-        if pattern in error_lower:
-            return "permanent", reason
-    
-    # Auth required - might work with auth later
-    auth_patterns = [
-        ("401", "http_401"),
-        ("403", "http_403"),
-        ("unauthorized", "unauthorized"),
-        ("forbidden", "forbidden"),
-        ("authentication required", "auth_required"),
-    ]
-    
-    for pattern, reason in auth_patterns:
+    for pattern, category, reason in FAILURE_PATTERNS:
         if pattern in error_lower:
-            return "auth_required", reason
-    
-    # Docker/container issues - environment specific
-    docker_patterns = [
-        ("docker", "docker_not_running"),
-        ("container", "container_error"),
-        ("daemon", "daemon_not_running"),
-    ]
-    
-    for pattern, reason in docker_patterns:
-        if pattern in error_lower:
-            return "permanent", reason  # Mark as permanent since Docker isn't set up
-    
-    # Everything else is transient - retry later
-    transient_patterns = [
-        ("timeout", "timeout"),
-        ("timed out", "timeout"),
-        ("connection refused", "connection_refused"),
-        ("connection reset", "connection_reset"),
-        ("rate limit", "rate_limited"),
-        ("500", "http_500"),
-        ("502", "http_502"),
-        ("503", "http_503"),
-        ("504", "http_504"),
-        ("server error", "server_error"),
-    ]
-    
-    for pattern, reason in transient_patterns:
-        if pattern in error_lower:
-            return "transient", reason
-    
-    # MCP SDK / protocol errors - server implementation is broken, treat as permanent
-    protocol_errors = [
-        ("taskgroup", "mcp_protocol_error"),
-        ("sub-exception", "mcp_protocol_error"),
-        ("unhandled errors", "mcp_protocol_error"),
-        ("too many values to unpack", "mcp_response_error"),
-        ("cannot unpack", "mcp_response_error"),
-        ("not enough values", "mcp_response_error"),
-        ("unexpected keyword argument", "mcp_sdk_error"),
-        ("type error", "mcp_type_error"),
-        ("attribute error", "mcp_attribute_error"),
-        ("json decode", "mcp_invalid_response"),
-        ("invalid json", "mcp_invalid_response"),
-    ]
-    
-    for pattern, reason in protocol_errors:
-        if pattern in error_lower:
-            return "permanent", reason  # Server is broken, won't fix itself
+            return category, reason
     
     # Default to transient for truly unknown errors
     return "transient", "unknown_error"
@@ -270,60 +296,136 @@ def update_extraction_status(
     error_message: Optional[str] = None,
     tools_count: int = 0,
     resources_count: int = 0,
-    prompts_count: int = 0
+    prompts_count: int = 0,
+    commit: bool = True,
+    now: Optional[str] = None
 ):
     """
     Update the extraction status for a server.
     This is the single source of truth for whether we should retry a server.
     """
     cursor = conn.cursor()
-    now = datetime.utcnow().isoformat()
+    now = now or datetime.utcnow().isoformat()
     
-    if success:
-        cursor.execute("""
-            INSERT INTO tool_extraction_status 
-            (server_name, status, failure_category, failure_reason, 
-             tools_count, resources_count, prompts_count, connection_method,
-             last_attempted_at, last_successful_at, retry_count)
-            VALUES (?, 'success', NULL, NULL, ?, ?, ?, ?, ?, ?, 0)
-            ON CONFLICT(server_name) DO UPDATE SET
-                status = 'success',
-                failure_category = NULL,
-                failure_reason = NULL,
-                tools_count = excluded.tools_count,
-                resources_count = excluded.resources_count,
-                prompts_count = excluded.prompts_count,
-                connection_method = excluded.connection_method,
-                last_attempted_at = excluded.last_attempted_at,
-                last_successful_at = excluded.last_successful_at,
-                retry_count = 0
-        """, (server_name, tools_count, resources_count, prompts_count, 
-              connection_method, now, now))
-    else:
-        failure_category, failure_reason = categorize_failure(error_message)
-        status = 'permanent_failure' if failure_category == 'permanent' else 'transient_failure'
+    with _transaction(conn, commit):
+        if success:
+            cursor.execute("""
+                INSERT INTO tool_extraction_status 
+                (server_name, status, failure_category, failure_reason, 
+                 tools_count, resources_count, prompts_count, connection_method,
+                 last_attempted_at, last_successful_at, retry_count)
+                VALUES (?, 'success', NULL, NULL, ?, ?, ?, ?, ?, ?, 0)
+                ON CONFLICT(server_name) DO UPDATE SET
+                    status = 'success',
+                    failure_category = NULL,
+                    failure_reason = NULL,
+                    tools_count = excluded.tools_count,
+                    resources_count = excluded.resources_count,
+                    prompts_count = excluded.prompts_count,
+                    connection_method = excluded.connection_method,
+                    last_attempted_at = excluded.last_attempted_at,
+                    last_successful_at = excluded.last_successful_at,
+                    retry_count = 0
+            """, (server_name, tools_count, resources_count, prompts_count, 
+                  connection_method, now, now))
+        else:
+            failure_category, failure_reason = categorize_failure(error_message)
+            status = 'permanent_failure' if failure_category == 'permanent' else 'transient_failure'
         
-        cursor.execute("""
-            INSERT INTO tool_extraction_status 
-            (server_name, status, failure_category, failure_reason, 
-             tools_count, resources_count, prompts_count, connection_method,
-             last_attempted_at, last_successful_at, retry_count)
-            VALUES (?, ?, ?, ?, 0, 0, 0, ?, ?, NULL, 1)
-            ON CONFLICT(server_name) DO UPDATE SET
-                status = excluded.status,
-                failure_category = excluded.failure_category,
-                failure_reason = excluded.failure_reason,
-                connection_method = excluded.connection_method,
-                last_attempted_at = excluded.last_attempted_at,
-                retry_count = tool_extraction_status.retry_count + 1
-        """, (server_name, status, failure_category, failure_reason, 
-              connection_method, now))
-    
-    conn.commit()
+            cursor.execute("""
+                INSERT INTO tool_extraction_status 
+                (server_name, status, failure_category, failure_reason, 
+                 tools_count, resources_count, prompts_count, connection_method,
+                 last_attempted_at, last_successful_at, retry_count)
+                VALUES (?, ?, ?, ?, 0, 0, 0, ?, ?, NULL, 1)
+                ON CONFLICT(server_name) DO UPDATE SET
+                    status = excluded.status,
+                    failure_category = excluded.failure_category,
+                    failure_reason = excluded.failure_reason,
+                    connection_method = excluded.connection_method,
+                    last_attempted_at = excluded.last_attempted_at,
+                    retry_count = tool_extraction_status.retry_count + 1
+            """, (server_name, status, failure_category, failure_reason, 
+                  connection_method, now))
 
 
 # ==================== ASYNC MCP CLIENT FUNCTIONS ====================
 
+# Snapshot of os.environ shared by stdio servers without env overrides
+_BASE_ENV: Optional[Dict[str, str]] = None
+
+
+def _base_env(refresh: bool = False) -> Dict[str, str]:
+    """Return the cached process environment, re-reading it when refresh is set."""
+    global _BASE_ENV
+    if _BASE_ENV is None or refresh:
+        _BASE_ENV = os.environ.copy()
+    return _BASE_ENV
+
+
+# The save_* helpers only read these fields, so copy them off the SDK models
+# directly instead of walking every nested model with model_dump().
+def _tool_dict(tool) -> Dict:
+    return {
+        'name': tool.name,
+        'title': getattr(tool, 'title', None),
+        'description': tool.description,
+        'inputSchema': tool.inputSchema,
+        'outputSchema': getattr(tool, 'outputSchema', None),
+    }
+
+
+def _resource_dict(resource) -> Dict:
+    return {
+        'uri': resource.uri,
+        'name': resource.name,
+        'description': resource.description,
+        'mimeType': resource.mimeType,
+    }
+
+
+def _prompt_dict(prompt) -> Dict:
+    arguments = prompt.arguments
+    return {
+        'name': prompt.name,
+        'description': prompt.description,
+        'arguments': [a.model_dump() for a in arguments] if arguments else arguments,
+    }
+
+
+async def _list_capabilities(session, timeout: int) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    """
+    Initialize a session and list its tools, resources and prompts.
+    
+    The three list requests are independent JSON-RPC calls, so they run
+    concurrently, each with its own timeout. Tools are required and re-raise
+    on failure; resources and prompts are optional and fall back to empty lists.
+    """
+    async with asyncio.timeout(timeout):
+        await session.initialize()
+    
+    tools_result, resources_result, prompts_result = await asyncio.gather(
+        asyncio.wait_for(session.list_tools(), timeout=timeout),
+        asyncio.wait_for(session.list_resources(), timeout=timeout),
+        asyncio.wait_for(session.list_prompts(), timeout=timeout),
+        return_exceptions=True,
+    )
+    if isinstance(tools_result, BaseException):
+        raise tools_result
+    
+    tools = [_tool_dict(t) for t in tools_result.tools] if tools_result.tools else []
+    
+    resources = []
+    if not isinstance(resources_result, BaseException) and resources_result.resources:
+        resources = [_resource_dict(r) for r in resources_result.resources]
+    
+    prompts = []
+    if not isinstance(prompts_result, BaseException) and prompts_result.prompts:
+        prompts = [_prompt_dict(p) for p in prompts_result.prompts]
+    
+    return tools, resources, prompts
+
+
 async def fetch_from_stdio(
     server_name: str,
     command: str,
@@ -342,9 +444,7 @@ async def fetch_from_stdio(
     
     try:
         # Merge provided env with current process environment
-        full_env = os.environ.copy()
-        if env:
-            full_env.update(env)
+        full_env = {**_base_env(), **env} if env else _base_env()
             
         server_params = StdioServerParameters(
             command=command,
@@ -355,27 +455,7 @@ async def fetch_from_stdio(
         
         async with stdio_client(server_params) as (read, write):
             async with ClientSession(read, write) as session:
-                # Initialize the connection
-                await asyncio.wait_for(session.initialize(), timeout=timeout)
-                
-                # Fetch tools
-                tools_result = await asyncio.wait_for(session.list_tools(), timeout=timeout)
-                tools = [t.model_dump() for t in tools_result.tools] if tools_result.tools else []
-                
-                # Fetch resources
-                try:
-                    resources_result = await asyncio.wait_for(session.list_resources(), timeout=timeout)
-                    resources = [r.model_dump() for r in resources_result.resources] if resources_result.resources else []
-                except Exception:
-                    resources = []
-                
-                # Fetch prompts
-                try:
-                    prompts_result = await asyncio.wait_for(session.list_prompts(), timeout=timeout)
-                    prompts = [p.model_dump() for p in prompts_result.prompts] if prompts_result.prompts else []
-                except Exception:
-                    prompts = []
-                
+                tools, resources, prompts = await _list_capabilities(session, timeout)
                 return tools, resources, prompts, None
                 
     except asyncio.TimeoutError:
@@ -384,6 +464,44 @@ async def fetch_from_stdio(
         return [], [], [], str(e)
 
 
+# Pooled httpx clients keyed by their (sorted) header items
+_HTTP_CLIENTS: Dict[Tuple[Tuple[str, str], ...], Any] = {}
+
+
+def _shared_http_client(headers: Optional[Dict[str, str]] = None):
+    """
+    Return a pooled httpx.AsyncClient for the given headers.
+    
+    The MCP transport reads headers off the client itself, so servers with
+    different auth headers can't share one client; servers with identical
+    headers (including none) reuse the same pool and keep-alive connections.
+    """
+    key = tuple(sorted(headers.items())) if headers else ()
+    client = _HTTP_CLIENTS.get(key)
+    if client is None:
+        import httpx
+        
+        client = httpx.AsyncClient(
+            headers=dict(key),
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=100, keepalive_expiry=30.0),
+            timeout=httpx.Timeout(30.0, read=300.0),
+            follow_redirects=True,
+        )
+        _HTTP_CLIENTS[key] = client
+    return client
+
+
+async def close_http_clients():
+    """Close all pooled clients. Must run on the loop that used them."""
+    clients = list(_HTTP_CLIENTS.values())
+    _HTTP_CLIENTS.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception:
+            pass
+
+
 async def fetch_from_http(
     server_name: str,
     url: str,
@@ -399,36 +517,11 @@ async def fetch_from_http(
         return [], [], [], "MCP SDK not installed"
     
     try:
-        import httpx
-        
-        # Create custom httpx client with headers if provided
-        http_client = None
-        if headers:
-            http_client = httpx.AsyncClient(headers=headers)
+        http_client = _shared_http_client(headers)
         
         async with streamable_http_client(url, http_client=http_client) as (read, write, _):
             async with ClientSession(read, write) as session:
-                # Initialize the connection
-                await asyncio.wait_for(session.initialize(), timeout=timeout)
-                
-                # Fetch tools
-                tools_result = await asyncio.wait_for(session.list_tools(), timeout=timeout)
-                tools = [t.model_dump() for t in tools_result.tools] if tools_result.tools else []
-                
-                # Fetch resources
-                try:
-                    resources_result = await asyncio.wait_for(session.list_resources(), timeout=timeout)
-                    resources = [r.model_dump() for r in resources_result.resources] if resources_result.resources else []
-                except Exception:
-                    resources = []
-                
-                # Fetch prompts
-                try:
-                    prompts_result = await asyncio.wait_for(session.list_prompts(), timeout=timeout)
-                    prompts = [p.model_dump() for p in prompts_result.prompts] if prompts_result.prompts else []
-                except Exception:
-                    prompts = []
-                
+                tools, resources, prompts = await _list_capabilities(session, timeout)
                 return tools, resources, prompts, None
                 
     except asyncio.TimeoutError:
@@ -439,11 +532,130 @@ async def fetch_from_http(
 
 # ==================== EXTRACTION FUNCTIONS ====================
 
+# Candidate query per connection method; each branch yields the same column layout
+_CANDIDATE_SQL = {
+    'remote': """
+            SELECT * FROM (
+                SELECT DISTINCT
+                    s.name,
+                    sr.transport_type,
+                    sr.url,
+                    sr.headers_json,
+                    NULL AS registry_type, NULL AS identifier, NULL AS version, NULL AS runtime_hint,
+                    NULL AS command, NULL AS args_json, NULL AS working_dir, NULL AS env_json,
+                    'remote' AS connection_method
+                FROM servers s
+                JOIN server_remotes sr ON s.name = sr.server_name
+                WHERE sr.url IS NOT NULL AND sr.url != ''
+            )""",
+    'stdio': """
+            SELECT * FROM (
+                SELECT DISTINCT
+                    s.name,
+                    sp.transport_type,
+                    NULL AS url, NULL AS headers_json,
+                    sp.registry_type, sp.identifier, sp.version, sp.runtime_hint,
+                    NULL AS command, NULL AS args_json, NULL AS working_dir, NULL AS env_json,
+                    'stdio' AS connection_method
+                FROM servers s
+                JOIN server_packages sp ON s.name = sp.server_name
+                WHERE sp.transport_type = 'stdio'
+            )""",
+    'local': """
+            SELECT * FROM (
+                SELECT DISTINCT
+                    s.name,
+                    NULL AS transport_type, NULL AS url, NULL AS headers_json,
+                    NULL AS registry_type, NULL AS identifier, NULL AS version, NULL AS runtime_hint,
+                    sls.command, sls.args_json, sls.working_dir, sls.env_json,
+                    'local' AS connection_method
+                FROM servers s
+                JOIN server_local_sources sls ON s.name = sls.server_name
+            )""",
+}
+
+# Columns each connection method contributes to its server dict
+_CONNECTABLE_COLUMNS = {
+    'remote': ('name', 'transport_type', 'url', 'headers_json', 'connection_method', 'requires_auth'),
+    'stdio': ('name', 'registry_type', 'identifier', 'version', 'runtime_hint', 'transport_type', 'connection_method'),
+    'local': ('name', 'command', 'args_json', 'working_dir', 'env_json', 'connection_method'),
+}
+
+
+def _connectable_query(
+    skip_auth: bool,
+    skip_extracted: bool,
+    query: Optional[str],
+    max_age: Optional[int],
+    connection_methods: Optional[Tuple[str, ...]]
+) -> Tuple[str, List]:
+    """Build the filtered candidate SELECT shared by the list and count helpers."""
+    # Skip set: servers with tools (successful extraction) or permanent failures,
+    # plus anything that succeeded within max_age
+    skip_parts = []
+    params = []
+    if skip_extracted:
+        skip_parts.append("SELECT server_name FROM tools")
+        skip_parts.append("SELECT server_name FROM tool_extraction_status WHERE status = 'permanent_failure'")
+    if max_age is not None:
+        skip_parts.append(
+            "SELECT server_name FROM tool_extraction_status "
+            "WHERE status = 'success' AND last_successful_at >= ?"
+        )
+        params.append((datetime.utcnow() - timedelta(seconds=max_age)).isoformat())
+    skip_cte = "\n        UNION\n        ".join(skip_parts) or "SELECT NULL AS server_name WHERE 0"
+    params.append(skip_auth)
+    
+    name_filter = ''
+    if query:
+        q = query.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        name_filter = "AND LOWER(c.name) LIKE ? ESCAPE '\\'"
+        params.append(f"%{q}%")
+    
+    methods = connection_methods or tuple(_CANDIDATE_SQL)
+    candidates_sql = "\n            UNION ALL".join(_CANDIDATE_SQL[m] for m in methods)
+    
+    # With skip_auth set, remote and stdio candidates that need auth are both
+    # dropped; local sources are never auth-filtered.
+    sql = f"""
+        WITH skip AS ({skip_cte}),
+        auth AS (
+            SELECT DISTINCT server_name FROM environment_variables WHERE is_secret = 1
+        ),
+        candidates AS (
+            {candidates_sql}
+        )
+        SELECT c.*, (a.server_name IS NOT NULL) AS requires_auth
+        FROM candidates c
+        LEFT JOIN auth a ON a.server_name = c.name
+        LEFT JOIN skip sk ON sk.server_name = c.name
+        WHERE sk.server_name IS NULL
+          AND NOT (? AND a.server_name IS NOT NULL AND c.connection_method != 'local')
+          {name_filter}"""
+    return sql, params
+
+
+def count_connectable_servers(
+    conn,
+    skip_auth: bool = True,
+    skip_extracted: bool = True,
+    query: Optional[str] = None,
+    max_age: Optional[int] = None,
+    connection_methods: Optional[Tuple[str, ...]] = None
+) -> int:
+    """Count the servers get_connectable_servers would return, without a limit."""
+    sql, params = _connectable_query(skip_auth, skip_extracted, query, max_age, connection_methods)
+    return conn.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+
+
 def get_connectable_servers(
     conn, 
     skip_auth: bool = True, 
     skip_extracted: bool = True,
-    query: Optional[str] = None
+    query: Optional[str] = None,
+    max_age: Optional[int] = None,
+    connection_methods: Optional[Tuple[str, ...]] = None,
+    limit: Optional[int] = None
 ) -> List[Dict]:
     """
     Get list of servers that can potentially be connected to.
@@ -451,6 +663,10 @@ def get_connectable_servers(
     Args:
         skip_auth: If True, skip servers that require authentication (env vars marked as secret)
         skip_extracted: If True, skip servers already successfully extracted or with permanent failures
+        max_age: If set, also skip servers successfully extracted within this many seconds,
+            even when skip_extracted is False
+        connection_methods: Only include these methods ('remote', 'stdio', 'local'); default all
+        limit: Maximum number of servers to return
     
     Returns servers with either:
     - Remote HTTP/SSE endpoints
@@ -458,129 +674,44 @@ def get_connectable_servers(
     """
     cursor = conn.cursor()
     
-    # Get servers to skip based on extraction status
-    already_extracted = set()
-    permanent_failures = set()
-    
     if skip_extracted:
-        # Skip successful extractions (have tools)
         cursor.execute("""
-            SELECT DISTINCT server_name FROM tools
+            SELECT
+                (SELECT COUNT(DISTINCT server_name) FROM tools) AS extracted,
+                (SELECT COUNT(*) FROM tool_extraction_status
+                 WHERE status = 'permanent_failure') AS failed
         """)
-        already_extracted = {row['server_name'] for row in cursor.fetchall()}
-        
-        # Skip permanent failures (won't ever succeed)
-        cursor.execute("""
-            SELECT server_name FROM tool_extraction_status 
-            WHERE status = 'permanent_failure'
-        """)
-        permanent_failures = {row['server_name'] for row in cursor.fetchall()}
-        
-        if already_extracted:
-            print(f"  Skipping {len(already_extracted)} servers with existing tools")
-        if permanent_failures:
-            print(f"  Skipping {len(permanent_failures)} servers with permanent failures")
-    
-    skip_set = already_extracted | permanent_failures
+        row = cursor.fetchone()
+        if row['extracted']:
+            print(f"  Skipping {row['extracted']} servers with existing tools")
+        if row['failed']:
+            print(f"  Skipping {row['failed']} servers with permanent failures")
+    
+    sql, params = _connectable_query(skip_auth, skip_extracted, query, max_age, connection_methods)
+    params.append(limit if limit is not None else -1)
+    cursor.execute(f"""
+        {sql}
+        LIMIT ?
+    """, params)
     
     servers = []
-    
-    # Get servers with remote endpoints
-    cursor.execute("""
-        SELECT DISTINCT 
-            s.name,
-            sr.transport_type,
-            sr.url,
-            sr.headers_json,
-            'remote' as connection_method
-        FROM servers s
-        JOIN server_remotes sr ON s.name = sr.server_name
-        WHERE sr.url IS NOT NULL AND sr.url != ''
-    """)
-    
     for row in cursor.fetchall():
-        server_name = row['name']
-        
-        # Skip already extracted or permanent failures
-        if server_name in skip_set:
-            continue
-        
-        # Check if requires auth - add flag but don't skip
-        cursor.execute("""
-            SELECT COUNT(*) as cnt FROM environment_variables 
-            WHERE server_name = ? AND is_secret = 1
-        """, (server_name,))
-        requires_auth = cursor.fetchone()['cnt'] > 0
-        
-        if skip_auth and requires_auth:
-            continue
-        
-        server_dict = dict(row)
-        server_dict['requires_auth'] = requires_auth
+        server_dict = {col: row[col] for col in _CONNECTABLE_COLUMNS[row['connection_method']]}
+        if 'requires_auth' in server_dict:
+            server_dict['requires_auth'] = bool(server_dict['requires_auth'])
         servers.append(server_dict)
     
-    # Get servers with stdio packages
-    cursor.execute("""
-        SELECT DISTINCT 
-            s.name,
-            sp.registry_type,
-            sp.identifier,
-            sp.version,
-            sp.runtime_hint,
-            sp.transport_type,
-            'stdio' as connection_method
-        FROM servers s
-        JOIN server_packages sp ON s.name = sp.server_name
-        WHERE sp.transport_type = 'stdio'
-    """)
-    
-    for row in cursor.fetchall():
-        server_name = row['name']
-        
-        # Skip already extracted or permanent failures
-        if server_name in skip_set:
-            continue
-            
-        if skip_auth:
-            cursor.execute("""
-                SELECT COUNT(*) as cnt FROM environment_variables 
-                WHERE server_name = ? AND is_secret = 1
-            """, (server_name,))
-            if cursor.fetchone()['cnt'] > 0:
-                continue
-        
-        servers.append(dict(row))
-    
-    # Get servers with local source paths
-    cursor.execute("""
-        SELECT DISTINCT 
-            s.name,
-            sls.command,
-            sls.args_json,
-            sls.working_dir,
-            sls.env_json,
-            'local' as connection_method
-        FROM servers s
-        JOIN server_local_sources sls ON s.name = sls.server_name
-    """)
-    
-    for row in cursor.fetchall():
-        server_name = row['name']
-        
-        # Skip already extracted or permanent failures
-        if server_name in skip_set:
-            continue
-        
-        servers.append(dict(row))
-    
-    # Apply query filter if provided
-    if query:
-        query = query.lower()
-        servers = [s for s in servers if query in s['name'].lower()]
-        
     return servers
 
 
+@lru_cache(maxsize=None)
+def _resolve_executable(command: str) -> str:
+    """Resolve a bare launcher name (npx, uvx, docker, ...) on PATH once per run."""
+    if os.sep in command or (os.altsep and os.altsep in command):
+        return command
+    return shutil.which(command) or command
+
+
 def build_stdio_command(server: Dict) -> Tuple[str, List[str]]:
     """Build the command and args for a stdio server based on registry type."""
     registry = server.get('registry_type', '')
@@ -602,7 +733,9 @@ def build_stdio_command(server: Dict) -> Tuple[str, List[str]]:
         return 'npx', ['-y', '--quiet', identifier]
 
 
-import re
+# Matches ${VAR_NAME} and ${input:VAR_NAME}
+_ENV_RE = re.compile(r'\$\{(?:input:)?([^}]+)\}')
+
 
 def resolve_env_vars(data: Any) -> Any:
     """Recursively resolve 'ENV:VAR_NAME', '${VAR_NAME}', or '${input:VAR_NAME}' strings."""
@@ -614,19 +747,13 @@ def resolve_env_vars(data: Any) -> Any:
         # Handle ENV:VAR_NAME
         if data.startswith("ENV:"):
             return os.environ.get(data[4:], data)
-            
-        # Handle ${input:VAR_NAME} or ${VAR_NAME}
-        # Regular expression for ${...}
-        pattern = r'\${(?:input:)?([^}]+)}'
         
-        def replace_match(match):
-            var_name = match.group(1)
-            val = os.environ.get(var_name)
-            if val is not None:
-                return val
-            return match.group(0) # Keep original if not found
-            
-        return re.sub(pattern, replace_match, data)
+        # Most values are literals; skip the regex engine for them
+        if '${' not in data:
+            return data
+        
+        # Keep the original placeholder if the variable isn't set
+        return _ENV_RE.sub(lambda m: os.environ.get(m.group(1), m.group(0)), data)
         
     return data
 
@@ -667,7 +794,7 @@ async def extract_from_server(
         
         print(f"  Starting {server_name} via {command}...")
         tools, resources, prompts, error = await fetch_from_stdio(
-            server_name, command, args, timeout=timeout
+            server_name, _resolve_executable(command), args, timeout=timeout
         )
     
     elif connection_method == 'local':
@@ -687,37 +814,46 @@ async def extract_from_server(
             server_name, command, args, timeout=timeout, cwd=working_dir, env=env
         )
     
-    # Log the connection attempt
-    success = error is None and (len(tools) > 0 or len(resources) > 0 or len(prompts) > 0)
-    log_connection(
-        conn,
-        server_name,
-        connection_method,
-        url_or_command,
-        success,
-        error,
-        len(tools),
-        len(resources),
-        len(prompts)
-    )
-    
-    # Update extraction status (used for skip logic)
-    update_extraction_status(
-        conn,
-        server_name,
-        success,
-        connection_method,
-        error,
-        len(tools),
-        len(resources),
-        len(prompts)
-    )
+    # Log the attempt, update its status and store the results in one transaction
+    tools_count, resources_count, prompts_count = len(tools), len(resources), len(prompts)
+    success = error is None and bool(tools_count or resources_count or prompts_count)
+    now = datetime.utcnow().isoformat()
+    with conn:
+        log_connection(
+            conn,
+            server_name,
+            connection_method,
+            url_or_command,
+            success,
+            error,
+            tools_count,
+            resources_count,
+            prompts_count,
+            commit=False,
+            now=now
+        )
+        
+        # Update extraction status (used for skip logic)
+        update_extraction_status(
+            conn,
+            server_name,
+            success,
+            connection_method,
+            error,
+            tools_count,
+            resources_count,
+            prompts_count,
+            commit=False,
+            now=now
+        )
+        
+        if success:
+            save_tools(conn, server_name, tools, commit=False, now=now)
+            save_resources(conn, server_name, resources, commit=False, now=now)
+            save_prompts(conn, server_name, prompts, commit=False, now=now)
     
     if success:
-        save_tools(conn, server_name, tools)
-        save_resources(conn, server_name, resources)
-        save_prompts(conn, server_name, prompts)
-        print(f"  ✓ {server_name}: {len(tools)} tools, {len(resources)} resources, {len(prompts)} prompts")
+        print(f"  ✓ {server_name}: {tools_count} tools, {resources_count} resources, {prompts_count} prompts")
         return True
     else:
         print(f"  ✗ {server_name}: {error or 'No data returned'}")
@@ -731,7 +867,10 @@ async def extract_all_tools(
     skip_auth: bool = True,
     skip_extracted: bool = True,
     timeout: int = 30,
-    query: Optional[str] = None
+    query: Optional[str] = None,
+    concurrency: int = 16,
+    max_age: Optional[int] = None,
+    local_only: bool = False
 ):
     """
     Extract tools from all connectable servers.
@@ -743,31 +882,44 @@ async def extract_all_tools(
         skip_auth: Skip servers that require authentication
         skip_extracted: Skip servers that already have tools in DB
         timeout: Connection timeout in seconds
+        concurrency: Maximum number of servers to connect to at once
+        max_age: Skip servers successfully extracted within this many seconds
+        local_only: Only try stdio packages and local sources
     """
     conn = init_database(db_path)
+    _base_env(refresh=True)
     
     servers = get_connectable_servers(
         conn, 
         skip_auth=skip_auth, 
         skip_extracted=skip_extracted,
-        query=query
+        query=query,
+        max_age=max_age,
+        connection_methods=('remote',) if remote_only else ('stdio', 'local') if local_only else None,
+        limit=max_servers
     )
     
-    if remote_only:
-        servers = [s for s in servers if s.get('connection_method') == 'remote']
-    
-    servers = servers[:max_servers]
-    
     print(f"\nAttempting to connect to {len(servers)} servers...")
     print("=" * 60)
     
-    success_count = 0
-    for server in servers:
-        try:
-            if await extract_from_server(conn, server, timeout=timeout):
-                success_count += 1
-        except Exception as e:
-            print(f"  ✗ {server['name']}: Unexpected error - {e}")
+    # Connections run concurrently, but every DB write in extract_from_server
+    # happens synchronously after its last await, so writes from different
+    # servers never interleave on the shared connection.
+    sem = asyncio.Semaphore(max(1, concurrency))
+    
+    async def _run(server: Dict) -> bool:
+        async with sem:
+            try:
+                return await extract_from_server(conn, server, timeout=timeout)
+            except Exception as e:
+                print(f"  ✗ {server['name']}: Unexpected error - {e}")
+                return False
+    
+    try:
+        results = await asyncio.gather(*(_run(s) for s in servers), return_exceptions=True)
+    finally:
+        await close_http_clients()
+    success_count = sum(1 for r in results if r is True)
     
     print("=" * 60)
     print(f"Successfully extracted from {success_count}/{len(servers)} servers")
@@ -835,6 +987,7 @@ def main():
     extract_parser.add_argument("--timeout", type=int, default=30, help="Connection timeout")
     extract_parser.add_argument("--include-stdio", action="store_true", help="Also try stdio servers (requires npm/uvx/docker)")
     extract_parser.add_argument("--include-auth", action="store_true", help="Include servers requiring auth")
+    extract_parser.add_argument("--concurrency", type=int, default=16, help="Max servers to connect to at once")
     
     # Single server command
     single_parser = subparsers.add_parser("single", help="Extract from a single server URL")
@@ -862,7 +1015,8 @@ def main():
             max_servers=args.max,
             remote_only=not args.include_stdio,
             skip_auth=not args.include_auth,
-            timeout=args.timeout
+            timeout=args.timeout,
+            concurrency=args.concurrency
         ))
     elif args.command == "single":
         if not MCP_SDK_AVAILABLE:
@@ -875,7 +1029,14 @@ def main():
             'connection_method': 'remote',
             'transport_type': 'streamable-http'
         }
-        asyncio.run(extract_from_server(conn, server))
+        
+        async def _single():
+            try:
+                await extract_from_server(conn, server)
+            finally:
+                await close_http_clients()
+        
+        asyncio.run(_single())
         conn.close()
     elif args.command == "stats":
         show_extraction_stats(Path(args.db))
@@ -5,40 +5,339 @@ Handles FTS5 keyword search and Vector semantic search for MCP tools.
 Uses embeddinggemma-300m for semantic embeddings and sqlite-vec for vector search.
 """
 
+import hashlib
 import json
 import math
+import os
+import re
+from functools import lru_cache
 import numpy as np
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Sequence, Tuple
 from sentence_transformers import SentenceTransformer
 from rich.progress import Progress
 
-from db import DATABASE_PATH, get_connection
+from db import DATABASE_PATH, EMBEDDING_INT8_SCALE, get_connection
 
 MODEL_NAME = "google/embeddinggemma-300m"
 
+# Documents per encode() call; SentenceTransformers batches internally, this
+# only bounds memory and sets how often progress/commits happen
+ENCODE_CHUNK_SIZE = 1024
+
+# Distinct query strings whose embeddings are kept per RelevanceEngine
+QUERY_CACHE_SIZE = 1024
+
+# Semantic (KNN) and keyword candidates fetched per search, each
+SEARCH_CANDIDATES = 200
+
+# The hybrid search statements are built once here: sqlite3's per-connection
+# statement cache is keyed on the SQL text, so identical strings skip the
+# parse/plan step on every call after the first.
+
+# Semantic candidates via the vec0 KNN index. Embeddings are unit length
+# stored as int8 scaled by EMBEDDING_INT8_SCALE, so
+# cosine similarity = 1 - (L2 / scale)^2 / 2
+_VEC_HITS_SQL = f"""
+    SELECT 
+        tool_id, 
+        (1.0 - distance * distance / {2.0 * EMBEDDING_INT8_SCALE ** 2}) as s_score
+    FROM tool_embeddings
+    WHERE embedding MATCH vec_int8(?) AND k = {SEARCH_CANDIDATES}
+"""
+
+# The same candidates computed in NumPy when sqlite-vec is missing, bound as JSON pairs
+_NUMPY_HITS_SQL = """
+    SELECT 
+        json_extract(value, '$[0]') as tool_id, 
+        json_extract(value, '$[1]') as s_score
+    FROM json_each(?)
+"""
+
+# Raw scores from both searches plus marketplace quality, keyed by whether
+# sqlite-vec is loaded. Driving from the (at most 400) hits keeps the plan to
+# index lookups; blending and BM25 normalization happen in Python.
+_CANDIDATES_SQL = {
+    has_vec: f"""
+        WITH 
+          vector_hits AS MATERIALIZED ({_VEC_HITS_SQL if has_vec else _NUMPY_HITS_SQL}),
+          -- Keyword candidates
+          fts_hits AS MATERIALIZED (
+            SELECT 
+                rowid as tool_id, 
+                (-bm25(tools_fts, 5.0, 3.0, 1.0)) as k_raw
+            FROM tools_fts
+            WHERE tools_fts MATCH ?
+            ORDER BY k_raw DESC
+            LIMIT {SEARCH_CANDIDATES}
+          ),
+          hits AS (
+            SELECT tool_id, s_score, NULL as k_raw FROM vector_hits
+            UNION ALL
+            SELECT tool_id, NULL, k_raw FROM fts_hits
+          )
+        SELECT 
+            h.tool_id,
+            h.s_score,
+            h.k_raw,
+            COALESCE(mr.total_score, 0) as quality
+        FROM hits h
+        JOIN tools_search ts ON ts.tool_id = h.tool_id
+        LEFT JOIN market_rankings mr ON ts.server_name = mr.server_name
+    """
+    for has_vec in (True, False)
+}
+
+# v_tools_full metadata added to the final page when hydrating. An inner join
+# lets SQLite flatten the view per hit; a LEFT JOIN would materialize the whole
+# view. Stale index rows without a tool drop out.
+_HYDRATE_COLUMNS = """,
+            vtf.title,
+            vtf.description as tool_description,
+            vtf.input_schema,
+            vtf.requires_auth,
+            vtf.server_description"""
+_HYDRATE_JOIN = "JOIN v_tools_full vtf ON ts.tool_id = vtf.tool_id"
+
+# Display fields for the final page, keyed by whether to hydrate. Ids are bound
+# as one JSON array so every page size shares a single cached statement.
+_HYDRATE_SQL = {
+    hydrate: f"""
+        SELECT 
+            ts.tool_id,
+            ts.tool_name, 
+            ts.server_name, 
+            ts.desc_text{_HYDRATE_COLUMNS if hydrate else ""}
+        FROM tools_search ts
+        {_HYDRATE_JOIN if hydrate else ""}
+        WHERE ts.tool_id IN (SELECT value FROM json_each(?))
+    """
+    for hydrate in (False, True)
+}
+
+# "onnx" runs the transformer through ONNX Runtime on CPU (needs
+# optimum[onnxruntime]); anything else uses the PyTorch model
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch").lower()
+# "bf16" runs the PyTorch model in bfloat16; anything else keeps fp32
+EMBEDDING_DTYPE = os.environ.get("EMBEDDING_DTYPE", "fp32").lower()
+# Where the exported, int8-quantized ONNX model is kept between runs
+ONNX_MODEL_DIR = Path(os.environ.get("EMBEDDING_ONNX_DIR", Path(__file__).parent / "models" / "embeddinggemma-onnx"))
+ONNX_QUANTIZED_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+
+def _model_device_and_dtype():
+    """
+    Pick where and in what precision to run the embedding model.
+    
+    fp32 unless EMBEDDING_DTYPE=bf16 opts in (EmbeddingGemma does not support
+    float16 activations). On CUDA the opt-in only applies when the GPU
+    supports bf16. Use the same setting for building the index and for
+    queries, since stored vectors don't record the precision that made them.
+    """
+    try:
+        import torch
+    except ImportError:
+        return "cpu", None
+    dtype = torch.bfloat16 if EMBEDDING_DTYPE == "bf16" else torch.float32
+    if torch.cuda.is_available():
+        if dtype == torch.bfloat16 and not torch.cuda.is_bf16_supported():
+            dtype = torch.float32
+        return "cuda", dtype
+    return "cpu", dtype
+
+
+def _load_onnx_model() -> SentenceTransformer:
+    """
+    Load EmbeddingGemma on the ONNX Runtime CPU backend with int8 dynamic quantization.
+    
+    The first call exports the model to ONNX, quantizes it for AVX-512 VNNI and
+    saves both under ONNX_MODEL_DIR; later calls load the quantized file
+    directly. Only the transformer runs in ONNX Runtime, so pooling, the dense
+    projections and normalization are unchanged and encode() keeps its signature.
+    Embeddings differ slightly from the PyTorch model, so re-embed the tools
+    after switching backends.
+    """
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+    
+    quantized_kwargs = {"file_name": ONNX_QUANTIZED_FILE, "provider": "CPUExecutionProvider"}
+    if (ONNX_MODEL_DIR / ONNX_QUANTIZED_FILE).exists():
+        return SentenceTransformer(str(ONNX_MODEL_DIR), device="cpu", backend="onnx", model_kwargs=quantized_kwargs)
+    
+    print(f"Exporting {MODEL_NAME} to ONNX in {ONNX_MODEL_DIR}...")
+    model = SentenceTransformer(MODEL_NAME, device="cpu", backend="onnx")
+    model.save_pretrained(str(ONNX_MODEL_DIR))
+    export_dynamic_quantized_onnx_model(model, "avx512_vnni", str(ONNX_MODEL_DIR))
+    return SentenceTransformer(str(ONNX_MODEL_DIR), device="cpu", backend="onnx", model_kwargs=quantized_kwargs)
+
+
+# Anything that isn't a (Unicode) word character or whitespace
+_FTS_SCRUB = re.compile(r'[^\w\s]')
+
+
+def fts_match_query(query: str) -> str:
+    """
+    Turn free text into an FTS5 MATCH expression.
+    
+    Punctuation is dropped but non-ASCII letters are kept, so non-English
+    terms still reach the unicode61 tokenizer. Each term is quoted so words
+    like AND/OR/NOT aren't read as operators; terms are still implicitly
+    ANDed. A query with no terms becomes an empty phrase, which matches
+    nothing instead of raising a syntax error.
+    """
+    return " ".join(f'"{term}"' for term in _FTS_SCRUB.sub(' ', query).split()) or '""'
+
+
+def doc_hash(full_doc: str) -> bytes:
+    """Content hash of an embedded document, stored alongside its vector."""
+    return hashlib.blake2b(full_doc.encode(), digest_size=16).digest()
+
+
+def quantize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """Scale unit-length embeddings (any shape) into the int8 values stored in tool_embeddings."""
+    return np.clip(np.round(embeddings * EMBEDDING_INT8_SCALE), -128, 127).astype(np.int8)
+
+
+def quantize_embedding(vec: np.ndarray) -> bytes:
+    """Scale a unit-length embedding into the int8 blob stored in tool_embeddings."""
+    return quantize_embeddings(vec).tobytes()
+
+
 class RelevanceEngine:
     def __init__(self, db_path: Path = DATABASE_PATH):
         self.db_path = db_path
         self._model = None
+        # Serializes the first load between warmup's thread and request threads
+        self._model_lock = threading.Lock()
+        # One connection per thread, opened on first use with sqlite-vec loaded
+        self._local = threading.local()
+        # Whether sqlite-vec loaded; without it KNN runs over the exported .npy matrix
+        self._has_vec: Optional[bool] = None
+        self._npy_index = None
+        # Repeated queries (paging, retries) skip the transformer forward pass
+        self._encode_query = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._encode_query_uncached)
 
     @property
     def model(self):
-        if self._model is None:
-            print(f"Loading model {MODEL_NAME}...")
-            self._model = SentenceTransformer(MODEL_NAME, device="cpu") # Use cpu for stability, change to cuda/mps if available
+        if self._model is not None:
+            return self._model
+        with self._model_lock:
+            if self._model is None and EMBEDDING_BACKEND == "onnx":
+                print(f"Loading model {MODEL_NAME} on cpu (onnx, int8)...")
+                self._model = _load_onnx_model()
+            if self._model is None:
+                device, dtype = _model_device_and_dtype()
+                print(f"Loading model {MODEL_NAME} on {device} ({dtype or 'default dtype'})...")
+                model_kwargs = {"torch_dtype": dtype} if dtype is not None else None
+                self._model = SentenceTransformer(MODEL_NAME, device=device, model_kwargs=model_kwargs)
         return self._model
 
-    def warmup(self):
-        """Pre-load the model into memory."""
-        _ = self.model
+    def _encode_query_uncached(self, query: str) -> bytes:
+        """Embed a search query into the int8 blob used for KNN matching."""
+        return quantize_embedding(
+            self.model.encode(query, convert_to_numpy=True, normalize_embeddings=True)
+        )
+
+    def get_conn(self) -> sqlite3.Connection:
+        """Return this thread's long-lived connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = get_connection(self.db_path, load_vec=True)
+            self._local.conn = conn
+            if self._has_vec is None:
+                try:
+                    conn.execute("SELECT vec_version()")
+                    self._has_vec = True
+                except sqlite3.OperationalError:
+                    self._has_vec = False
+                    print("Warning: sqlite-vec unavailable; semantic search falls back to NumPy.")
+        return conn
+
+    def close(self):
+        """Close the calling thread's connection, if one was opened."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def warmup(self) -> threading.Thread:
+        """
+        Start loading the model on a background thread and return immediately.
+        
+        Whoever needs the model first waits on the same lock, so a request
+        that arrives mid-load blocks only for the remainder. If loading fails
+        here, the next use retries and raises.
+        """
+        thread = threading.Thread(target=lambda: self.model, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def _npy_paths(self) -> Tuple[Path, Path]:
+        """Locations of the exported embedding matrix and its tool ids, next to the database."""
+        db_path = Path(self.db_path)
+        return db_path.with_suffix(".embeddings.npy"), db_path.with_suffix(".embedding_ids.npy")
+
+    def export_embeddings_npy(self):
+        """
+        Dump tool_embeddings to a (N, 768) int8 .npy matrix plus a tool id
+        array, for hosts where sqlite-vec can't be loaded.
+        """
+        cursor = self.get_conn().cursor()
+        cursor.execute("SELECT tool_id, embedding FROM tool_embeddings ORDER BY tool_id")
+        rows = cursor.fetchall()
+        
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        matrix = np.frombuffer(b"".join(r[1] for r in rows), dtype=np.int8).reshape(len(rows), -1)
+        
+        matrix_path, ids_path = self._npy_paths()
+        np.save(matrix_path, matrix)
+        np.save(ids_path, ids)
+        self._npy_index = None
+
+    def _load_npy_index(self):
+        """Load the exported matrix once; None when it hasn't been exported."""
+        if self._npy_index is None:
+            matrix_path, ids_path = self._npy_paths()
+            if not (matrix_path.exists() and ids_path.exists()):
+                print(f"Warning: {matrix_path.name} not found; semantic search disabled.")
+                self._npy_index = False
+                return None
+            ids = np.load(ids_path)
+            # int8 values and their 768-term dot products are exact in float32,
+            # and float32 lets the matmul go through BLAS
+            matrix = np.load(matrix_path, mmap_mode="r").astype(np.float32)
+            sq_norms = np.einsum("ij,ij->i", matrix, matrix).astype(np.float64)
+            self._npy_index = (ids, matrix, sq_norms)
+        return self._npy_index or None
+
+    def _numpy_vector_hits(self, query_blob: bytes) -> List[Tuple[int, float]]:
+        """
+        KNN fallback mirroring the vec0 query: top SEARCH_CANDIDATES tools by L2
+        distance over the int8 embeddings, scored as cosine similarity.
+        """
+        index = self._load_npy_index()
+        if index is None:
+            return []
+        ids, matrix, sq_norms = index
+        
+        q = np.frombuffer(query_blob, dtype=np.int8).astype(np.float32)
+        # Squared L2 distance; summed in float64 since it can exceed 2^24
+        sq_dist = sq_norms + float(q @ q) - 2.0 * (matrix @ q).astype(np.float64)
+        
+        k = min(SEARCH_CANDIDATES, len(ids))
+        if k == 0:
+            return []
+        top = np.argpartition(sq_dist, k - 1)[:k]
+        s_scores = 1.0 - sq_dist[top] / (2.0 * EMBEDDING_INT8_SCALE ** 2)
+        return [(int(t), float(s)) for t, s in zip(ids[top], s_scores)]
 
     def build_search_index(self, progress: Optional[Progress] = None):
         """
         Populate the tools_search and tools_fts tables.
         """
-        conn = get_connection(self.db_path)
+        conn = self.get_conn()
         cursor = conn.cursor()
         
         # 1. Clear existing index
@@ -62,7 +361,22 @@ class RelevanceEngine:
             task_id = progress.add_task("[bold cyan]Building Search Index...", total=len(tools))
         else:
             task_id = None
-            
+        
+        # Fetch all parameters in one pass, in the same (index) order the
+        # per-tool lookup used to return them
+        cursor.execute("""
+            SELECT server_name, tool_name, param_name, description, enum_values
+            FROM tool_parameters
+            ORDER BY server_name, tool_name, param_name
+        """)
+        params_by_tool: Dict[Tuple[str, str], List[str]] = {}
+        for p in cursor.fetchall():
+            p_text = f"{p['param_name']}: {p['description']}"
+            if p['enum_values']:
+                p_text += f" (enums: {p['enum_values']})"
+            params_by_tool.setdefault((p['server_name'], p['tool_name']), []).append(p_text)
+        
+        rows = []
         for tool in tools:
             tool_id = tool['tool_id']
             tool_name = tool['tool_name']
@@ -71,22 +385,7 @@ class RelevanceEngine:
             description = tool['description'] or ""
             server_description = tool['server_description'] or ""
             
-            # Fetch parameters
-            cursor.execute("""
-                SELECT param_name, description, enum_values
-                FROM tool_parameters
-                WHERE tool_name = ? AND server_name = ?
-            """, (tool_name, server_name))
-            params = cursor.fetchall()
-            
-            param_parts = []
-            for p in params:
-                p_text = f"{p['param_name']}: {p['description']}"
-                if p['enum_values']:
-                    p_text += f" (enums: {p['enum_values']})"
-                param_parts.append(p_text)
-            
-            params_text = " | ".join(param_parts)
+            params_text = " | ".join(params_by_tool.get((server_name, tool_name), ()))
             
             # Construct segments
             # Move server_name out of name_text (weight 5.0) into desc_text (weight 3.0)
@@ -96,36 +395,52 @@ class RelevanceEngine:
             # The full doc passed to the embedding model
             full_doc = f"Tool: {tool_name}\nServer: {server_name}\nTitle: {title}\nDescription: {description}\nServer Description: {server_description}\nParameters: {params_text}"
             
-            cursor.execute("""
-                INSERT INTO tools_search (tool_id, tool_name, server_name, name_text, desc_text, params_text, full_doc)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (tool_id, tool_name, server_name, name_text, desc_text, params_text, full_doc))
-            
-            if progress:
-                progress.update(task_id, advance=1)
-                
-        # 3. Synchronize FTS5
+            rows.append((tool_id, tool_name, server_name, name_text, desc_text, params_text, full_doc))
+        
+        cursor.executemany("""
+            INSERT INTO tools_search (tool_id, tool_name, server_name, name_text, desc_text, params_text, full_doc)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        
+        if progress:
+            progress.update(task_id, advance=len(rows))
+        
+        # 3. Synchronize FTS5 (same transaction, so readers never see a half-built index)
         cursor.execute("INSERT INTO tools_fts(tools_fts) VALUES('rebuild')")
         
         conn.commit()
-        conn.close()
         print("✓ Search index rebuilt.")
 
-    def update_embeddings(self, progress: Optional[Progress] = None, batch_size: int = 16):
+    def update_embeddings(self, progress: Optional[Progress] = None, batch_size: int = 64):
         """
-        Generate and store embeddings for all tools.
+        Generate and store embeddings for tools that are new or whose document changed.
         """
-        conn = get_connection(self.db_path, load_vec=True)
+        conn = self.get_conn()
         cursor = conn.cursor()
         
-        # Get documents needing embeddings
+        # Compare each document's hash with the one its stored vector was built
+        # from. Documents are streamed and only ids/hashes kept, so the full
+        # text is never held for the whole corpus at once.
         cursor.execute("""
-            SELECT ts.tool_id, ts.full_doc 
+            SELECT ts.tool_id, ts.full_doc, te.tool_id IS NOT NULL as embedded, te.doc_hash
             FROM tools_search ts
             LEFT JOIN tool_embeddings te ON ts.tool_id = te.tool_id
-            WHERE te.tool_id IS NULL
         """)
-        rows = cursor.fetchall()
+        cursor.arraysize = ENCODE_CHUNK_SIZE
+        rows = []
+        backfill = []
+        while fetched := cursor.fetchmany():
+            for r in fetched:
+                h = doc_hash(r['full_doc'])
+                if not r['embedded'] or (r['doc_hash'] is not None and r['doc_hash'] != h):
+                    rows.append((r['tool_id'], h))
+                elif r['doc_hash'] is None:
+                    # Embedded before hashes were tracked; adopt the current document
+                    backfill.append((h, r['tool_id']))
+        
+        if backfill:
+            with conn:
+                cursor.executemany("UPDATE tool_embeddings SET doc_hash = ? WHERE tool_id = ?", backfill)
         
         if not rows:
             print("All tools have up-to-date embeddings.")
@@ -138,110 +453,153 @@ class RelevanceEngine:
             task_id = None
             print(f"Generating embeddings for {total_tools} tools in batches of {batch_size}...")
 
-        for i in range(0, total_tools, batch_size):
-            batch = rows[i:i + batch_size]
-            batch_ids = [r['tool_id'] for r in batch]
-            batch_docs = [r['full_doc'] for r in batch]
-            
-            # Generate embeddings for the batch
-            # SentenceTransformers uses its own internal batching too, but this explicit loop
-            # ensures we don't hold the entire results set in memory at once.
-            embeddings = self.model.encode(batch_docs, show_progress_bar=False, convert_to_numpy=True)
-            
-            for tid, emb in zip(batch_ids, embeddings):
-                # sqlite-vec expects a list or buffer
-                cursor.execute(
-                    "INSERT OR REPLACE INTO tool_embeddings(tool_id, embedding) VALUES (?, ?)",
-                    (tid, emb.tobytes())
-                )
-            
-            # Commit after each batch to free journal/memory and keep state
-            conn.commit()
-            
-            if progress:
-                progress.update(task_id, advance=len(batch))
+        # Writes run on a single background thread (with its own connection) so
+        # chunk N is stored while chunk N+1 encodes. Waiting on the previous
+        # write before submitting keeps at most one encoded chunk queued.
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            pending = None
+            try:
+                for i in range(0, total_tools, ENCODE_CHUNK_SIZE):
+                    batch_ids, batch_hashes = zip(*rows[i:i + ENCODE_CHUNK_SIZE])
+                    
+                    # Only this chunk's documents are loaded
+                    cursor.execute(
+                        "SELECT tool_id, full_doc FROM tools_search WHERE tool_id IN (SELECT value FROM json_each(?))",
+                        (json.dumps(batch_ids),)
+                    )
+                    docs = dict(cursor.fetchall())
+                    
+                    # One encode() per chunk; SentenceTransformers splits it into
+                    # batch_size forward passes (sorted by length to limit padding)
+                    embeddings = self.model.encode(
+                        [docs[tid] for tid in batch_ids], batch_size=batch_size, show_progress_bar=False,
+                        convert_to_numpy=True, normalize_embeddings=True
+                    )
+                    
+                    if pending is not None:
+                        written = pending.result()
+                        if progress:
+                            progress.update(task_id, advance=written)
+                    pending = writer.submit(self._write_embeddings, batch_ids, embeddings, batch_hashes)
                 
-        conn.close()
+                written = pending.result()
+                if progress:
+                    progress.update(task_id, advance=written)
+            finally:
+                writer.submit(self.close)
+        
+        self.export_embeddings_npy()
         print("✓ Tool embeddings updated.")
 
-    def hybrid_search(self, query: str, limit: int = 10) -> List[Dict]:
+    def _write_embeddings(self, tool_ids: Sequence[int], embeddings: np.ndarray, hashes: Sequence[bytes]) -> int:
+        """Store one encoded chunk; runs on the embedding writer thread."""
+        conn = self.get_conn()
+        # vec0 rejects INSERT OR REPLACE on an existing key, so changed documents
+        # drop their old vector first
+        conn.executemany("DELETE FROM tool_embeddings WHERE tool_id = ?", [(tid,) for tid in tool_ids])
+        # Stored as int8; vec_int8 tags the raw bytes with the right vector type.
+        # The chunk is quantized in one pass and each row is bound through the
+        # buffer protocol, so no per-tool bytes copy is made.
+        quantized = quantize_embeddings(embeddings)
+        conn.executemany(
+            "INSERT INTO tool_embeddings(tool_id, embedding, doc_hash) VALUES (?, vec_int8(?), ?)",
+            zip(tool_ids, quantized, hashes)
+        )
+        # Commit each chunk so progress survives an interrupted run without
+        # holding the write lock for the whole (model-bound) encode
+        conn.commit()
+        return len(tool_ids)
+
+    def hybrid_search(self, query: str, limit: int = 10, hydrate: bool = False) -> List[Dict]:
         """
         Perform hybrid search using FTS5 and Vector Similarity.
+
+        With hydrate=True each hit also carries the v_tools_full metadata
+        (title, tool description, input schema, server description, auth flag)
+        so callers don't need a second round-trip to render results.
         """
-        conn = get_connection(self.db_path, load_vec=True)
-        cursor = conn.cursor()
+        return self.hydrate_hits(self.rank_candidates(query, limit), hydrate=hydrate)
+
+    def rank_candidates(self, query: str, limit: int = 10) -> List[Tuple[float, int, float, float]]:
+        """
+        Score and rank tools for a query without fetching any display fields.
+
+        Returns (final_score, tool_id, relevance, quality) tuples, best first.
+        Pass a slice of them to hydrate_hits to render just one page.
+        """
+        cursor = self.get_conn().cursor()
         
-        # 1. Generate query embedding
-        query_vec = self.model.encode(query, convert_to_numpy=True)
+        # 1. Generate query embedding (cached; surrounding whitespace doesn't change intent)
+        query_blob = self._encode_query(query.strip())
         
-        # 2. Consolidated Discovery Query using CTEs
-        # This performs both searches, normalizes BM25, joins with metadata/quality,
-        # and calculates the final score in a single operation.
-        # Sanitize for FTS5: Remove characters that break FTS5 MATCH syntax
-        # We remove everything that isn't alphanumeric or space to be safe
-        import re
-        fts_query = re.sub(r'[^a-zA-Z0-9\s]', ' ', query).strip()
+        fts_query = fts_match_query(query)
 
-        cursor.execute("""
-            WITH 
-              -- Semantic candidates (Top 200)
-              vector_hits AS (
-                SELECT 
-                    tool_id, 
-                    (1.0 - vec_distance_cosine(embedding, ?)) as s_score
-                FROM tool_embeddings
-                ORDER BY s_score DESC 
-                LIMIT 200
-              ),
-              -- Keyword candidates (Top 200)
-              fts_hits AS (
-                SELECT 
-                    rowid as tool_id, 
-                    (-bm25(tools_fts, 5.0, 3.0, 1.0)) as k_raw
-                FROM tools_fts
-                WHERE tools_fts MATCH ?
-                ORDER BY k_raw DESC
-                LIMIT 200
-              ),
-              -- Group stats for normalization
-              k_stats AS (
-                SELECT MAX(k_raw) as k_max FROM fts_hits
-              )
-            SELECT 
-                ts.tool_id,
-                ts.tool_name, 
-                ts.server_name, 
-                ts.desc_text,
-                -- Combined Relevance: 0.7*Semantic + 0.3*NormalizedKeyword
-                (
-                  (0.7 * COALESCE(v.s_score, 0.0)) + 
-                  (0.3 * COALESCE(log1p(k.k_raw) / log1p(NULLIF(ks.k_max, 0)), 0.0))
-                ) as relevance,
-                COALESCE(mr.total_score, 0) as quality
-            FROM tools_search ts
-            LEFT JOIN vector_hits v ON ts.tool_id = v.tool_id
-            LEFT JOIN fts_hits k ON ts.tool_id = k.tool_id
-            LEFT JOIN k_stats ks ON 1=1
-            LEFT JOIN market_rankings mr ON ts.server_name = mr.server_name
-            WHERE (v.tool_id IS NOT NULL OR k.tool_id IS NOT NULL)
-              AND relevance > 0.3  -- Minimum relevance bar filter
-            ORDER BY (0.8 * relevance) + (0.2 * quality) DESC
-            LIMIT ?
-        """, (query_vec.tobytes(), fts_query, limit))
+        if self._has_vec:
+            vector_param = query_blob
+        else:
+            # Same candidates computed in NumPy, passed in as JSON pairs
+            vector_param = json.dumps(self._numpy_vector_hits(query_blob))
+
+        # 2. Candidate pass: raw scores from both searches plus marketplace quality
+        cursor.execute(_CANDIDATES_SQL[self._has_vec], (vector_param, fts_query))
         
-        results = []
+        s_scores: Dict[int, float] = {}
+        k_raws: Dict[int, float] = {}
+        qualities: Dict[int, float] = {}
         for r in cursor.fetchall():
-            relevance = r['relevance']
-            quality = r['quality']
-            results.append({
-                'tool_id': r['tool_id'],
+            if r['k_raw'] is None:
+                s_scores[r['tool_id']] = r['s_score']
+            else:
+                k_raws[r['tool_id']] = r['k_raw']
+            qualities[r['tool_id']] = r['quality']
+        
+        # 3. Combined Relevance: 0.7*Semantic + 0.3*NormalizedKeyword, where
+        # keyword scores are log-scaled against the best keyword hit
+        log_k_max = math.log1p(max(0.0, max(k_raws.values(), default=0.0)))
+        ranked = []
+        for tool_id, quality in qualities.items():
+            k_raw = k_raws.get(tool_id)
+            k_score = math.log1p(max(0.0, k_raw)) / log_k_max if k_raw is not None and log_k_max > 0 else 0.0
+            relevance = (0.7 * s_scores.get(tool_id, 0.0)) + (0.3 * k_score)
+            if relevance > 0.3:  # Minimum relevance bar filter
+                ranked.append(((0.8 * relevance) + (0.2 * quality), tool_id, relevance, quality))
+        ranked.sort(key=lambda x: x[0], reverse=True)
+        return ranked[:limit]
+
+    def hydrate_hits(self, ranked: List[Tuple[float, int, float, float]], hydrate: bool = False) -> List[Dict]:
+        """Fetch display fields for ranked candidates, keeping their order."""
+        if not ranked:
+            return []
+        
+        cursor = self.get_conn().cursor()
+        
+        # 4. Hydration pass for the final page only
+        cursor.execute(_HYDRATE_SQL[hydrate], (json.dumps([tool_id for _, tool_id, _, _ in ranked]),))
+        rows = {r['tool_id']: r for r in cursor.fetchall()}
+        
+        results = []
+        for final_score, tool_id, relevance, quality in ranked:
+            r = rows.get(tool_id)
+            if r is None:
+                continue
+            hit = {
+                'tool_id': tool_id,
                 'tool_name': r['tool_name'],
                 'server_name': r['server_name'],
                 'description': r['desc_text'],
                 'relevance': relevance,
                 'quality': quality,
-                'final_score': (0.8 * relevance) + (0.2 * quality)
-            })
+                'final_score': final_score
+            }
+            if hydrate:
+                hit.update({
+                    'title': r['title'],
+                    'tool_description': r['tool_description'],
+                    'input_schema': r['input_schema'],
+                    'requires_auth': bool(r['requires_auth']),
+                    'server_description': r['server_description'],
+                })
+            results.append(hit)
             
         return results
 
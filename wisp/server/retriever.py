@@ -11,7 +11,7 @@ import sqlite3
 from pathlib import Path
 from typing import List, Dict, Optional, Any
 
-from db import DATABASE_PATH, get_connection
+from db import DATABASE_PATH
 from relevance import RelevanceEngine
 
 class Retriever:
@@ -20,8 +20,12 @@ class Retriever:
         self.relevance_engine = RelevanceEngine(db_path)
 
     def warmup(self):
-        """Pre-load the relevance engine (model)."""
-        self.relevance_engine.warmup()
+        """Start pre-loading the relevance engine (model) in the background."""
+        return self.relevance_engine.warmup()
+
+    def close(self):
+        """Release the shared database connection."""
+        self.relevance_engine.close()
 
     def retrieve(self, query: str, page: int = 1, limit: int = 10) -> Dict[str, Any]:
         """
@@ -30,82 +34,41 @@ class Retriever:
         # We fetch a larger candidate set initially to allow for discovery
         # across both relevance and marketplace quality.
         candidate_limit = 100
-        candidates = self.relevance_engine.hybrid_search(query, limit=candidate_limit)
+        ranked = self.relevance_engine.rank_candidates(query, limit=candidate_limit)
         
-        total_results = len(candidates)
+        total_results = len(ranked)
         start_idx = (page - 1) * limit
         end_idx = start_idx + limit
         
-        paged_candidates = candidates[start_idx:end_idx]
-        
-        # Hydrate candidates with full metadata in batches
-        if not paged_candidates:
-            return {
-                "query": query,
-                "page": page,
-                "limit": limit,
-                "total_candidates": total_results,
-                "results": []
-            }
-            
-        tool_ids = [c['tool_id'] for c in paged_candidates]
-        cand_map = {c['tool_id']: c for c in paged_candidates}
-        
-        conn = get_connection(self.db_path)
-        cursor = conn.cursor()
-        
-        # 1. Fetch all tool/server metadata for this page
-        placeholders = ",".join(["?"] * len(tool_ids))
-        cursor.execute(f"""
-            SELECT 
-                t.id as tool_id,
-                vt.tool_name,
-                vt.title,
-                vt.description,
-                vt.requires_auth,
-                vt.server_name,
-                vt.server_description,
-                vt.input_schema
-            FROM tools t
-            JOIN v_tools_full vt ON t.id = vt.tool_id
-            WHERE t.id IN ({placeholders})
-        """, tuple(tool_ids))
-        
-        db_results = cursor.fetchall()
+        # Candidates are ranked without metadata; only the requested page is
+        # hydrated, and it comes back already ordered by score.
+        page_hits = self.relevance_engine.hydrate_hits(ranked[start_idx:end_idx], hydrate=True)
         
         final_results = []
-        for db_r in db_results:
-            tid = db_r['tool_id']
-            cand = cand_map[tid]
-            
+        for cand in page_hits:
             # Parse input_schema if present
             input_schema = None
-            if db_r['input_schema']:
+            if cand['input_schema']:
                 try:
-                    input_schema = json.loads(db_r['input_schema'])
+                    input_schema = json.loads(cand['input_schema'])
                 except json.JSONDecodeError:
                     pass
 
             final_results.append({
-                "tool_id": tid,
-                "name": db_r['tool_name'],
-                "title": db_r['title'],
-                "description": db_r['description'],
+                "tool_id": cand['tool_id'],
+                "name": cand['tool_name'],
+                "title": cand['title'],
+                "description": cand['tool_description'],
                 "input_schema": input_schema,
-                "requires_auth": bool(db_r['requires_auth']),
+                "requires_auth": cand['requires_auth'],
                 "server": {
-                    "name": db_r['server_name'],
-                    "description": db_r['server_description']
+                    "name": cand['server_name'],
+                    "description": cand['server_description']
                 },
                 "relevance": cand['relevance'],
                 "quality": cand['quality'],
                 "score": cand['final_score']
             })
-            
-        # Re-sort by score as the DB query might lose ordering
-        final_results.sort(key=lambda x: x['score'], reverse=True)
-            
-        conn.close()
         
         return {
             "query": query,
@@ -115,14 +78,19 @@ class Retriever:
             "results": final_results
         }
 
-    def get_tools_for_server(self, server_name: str) -> List[Dict[str, Any]]:
+    def get_tools_for_server(self, server_name: str, load_schemas: bool = True) -> List[Dict[str, Any]]:
         """
         Retrieve all tools for a given server name.
+
+        With load_schemas=False the input schemas are neither read nor parsed
+        and the input_schema key is omitted, for listings that only need names
+        and descriptions.
         """
-        conn = get_connection(self.db_path)
-        cursor = conn.cursor()
+        # Shares the engine's long-lived connection
+        cursor = self.relevance_engine.get_conn().cursor()
         
-        cursor.execute("""
+        schema_col = ", input_schema" if load_schemas else ""
+        cursor.execute(f"""
             SELECT 
                 tool_id,
                 tool_name,
@@ -130,36 +98,37 @@ class Retriever:
                 description,
                 requires_auth,
                 server_name,
-                server_description,
-                input_schema
+                server_description{schema_col}
             FROM v_tools_full 
             WHERE server_name = ?
         """, (server_name,))
         
         db_results = cursor.fetchall()
-        conn.close()
         
         results = []
         for db_r in db_results:
-            # Parse input_schema if present
-            input_schema = None
-            if db_r['input_schema']:
-                try:
-                    input_schema = json.loads(db_r['input_schema'])
-                except json.JSONDecodeError:
-                    pass
-
-            results.append({
+            tool = {
                 "tool_id": db_r['tool_id'],
                 "name": db_r['tool_name'],
                 "title": db_r['title'],
                 "description": db_r['description'],
-                "input_schema": input_schema,
-                "requires_auth": bool(db_r['requires_auth']),
-                "server": {
-                    "name": db_r['server_name'],
-                    "description": db_r['server_description']
-                }
-            })
+            }
+
+            if load_schemas:
+                # Parse input_schema if present
+                input_schema = None
+                if db_r['input_schema']:
+                    try:
+                        input_schema = json.loads(db_r['input_schema'])
+                    except json.JSONDecodeError:
+                        pass
+                tool["input_schema"] = input_schema
+
+            tool["requires_auth"] = bool(db_r['requires_auth'])
+            tool["server"] = {
+                "name": db_r['server_name'],
+                "description": db_r['server_description']
+            }
+            results.append(tool)
             
         return results
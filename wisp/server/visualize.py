@@ -3,30 +3,121 @@
 MCP Registry Data Visualizer & Stats
 
 Query and visualize data from the extracted MCP Registry SQLite database.
-Uses the shared db.py module.
+Uses the shared db.py module. Query functions take an optional open `conn`
+to share; without one they open and close their own connection.
 """
 
 import json
 import csv
+import os
+import re
+import sqlite3
+import sys
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from functools import wraps
 from pathlib import Path
 import argparse
 from typing import Optional, Dict, Any, List
 
-from db import DATABASE_PATH, get_connection
+from db import DATABASE_PATH, decode_raw_json, ensure_listing_schema, get_connection
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    """Open the registry, adding the listing columns and FTS indexes older databases lack."""
+    conn = get_connection(db_path)
+    ensure_listing_schema(conn)
+    return conn
 
 
 # ==================== STATS FUNCTIONS ====================
 
-def get_stats(db_path: Path = DATABASE_PATH) -> Dict[str, Any]:
+STATS_CACHE_PATH = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "wisp" / "stats.json"
+
+
+def _updated_cutoff() -> str:
+    """Start of the UTC day 30 days ago; updated_last_30_days counts from here."""
+    return (datetime.now(timezone.utc).date() - timedelta(days=30)).isoformat()
+
+
+def _db_fingerprint(db_path: Path) -> List[Any]:
+    """
+    Cache key for a database's stats. Changes on any write (to the file or its
+    WAL) and with the updated_last_30_days cutoff, which moves once a UTC day.
+    """
+    key: List[Any] = [str(Path(db_path).resolve()), _updated_cutoff()]
+    for path in (Path(db_path), Path(f"{db_path}-wal")):
+        try:
+            st = os.stat(path)
+            key += [st.st_mtime_ns, st.st_size]
+        except FileNotFoundError:
+            key += [None, None]
+    return key
+
+
+def _disk_cached_stats(func):
+    """
+    Keep the last get_stats result in STATS_CACHE_PATH and reuse it while the
+    database is unchanged. The by_* breakdowns are stored as item lists so
+    their None keys survive the JSON round-trip.
+    """
+    @wraps(func)
+    def wrapper(db_path: Path = DATABASE_PATH, conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
+        if not Path(db_path).exists():
+            return func(db_path, conn)
+        
+        key = _db_fingerprint(db_path)
+        try:
+            cached = json.loads(STATS_CACHE_PATH.read_text(encoding="utf-8"))
+            if cached["key"] == key:
+                return {k: dict(v) if isinstance(v, list) else v for k, v in cached["stats"].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        
+        stats = func(db_path, conn)
+        try:
+            STATS_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = STATS_CACHE_PATH.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps({
+                "key": key,
+                "stats": {k: list(v.items()) if isinstance(v, dict) else v for k, v in stats.items()},
+            }), encoding="utf-8")
+            os.replace(tmp_path, STATS_CACHE_PATH)
+        except OSError:
+            pass
+        return stats
+    
+    return wrapper
+
+
+@_disk_cached_stats
+def get_stats(db_path: Path = DATABASE_PATH, conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
     """Get summary statistics from the database."""
-    conn = get_connection(db_path)
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect(db_path)
     cursor = conn.cursor()
     
     stats = {}
     
-    # Total servers
-    cursor.execute("SELECT COUNT(*) as count FROM servers")
-    stats["total_servers"] = cursor.fetchone()["count"]
+    # Scalar counts in one pass: servers aggregates plus per-table subqueries
+    cursor.execute("""
+        SELECT
+            COUNT(*) as total_servers,
+            COALESCE(SUM(CASE WHEN updated_at >= ?
+                              THEN 1 ELSE 0 END), 0) as updated_last_30_days,
+            (SELECT COUNT(DISTINCT server_name) FROM server_remotes) as with_remote_url,
+            (SELECT COUNT(DISTINCT server_name) FROM environment_variables
+             WHERE is_secret = 1) as requires_auth,
+            (SELECT COUNT(*) FROM tools) as total_tools,
+            (SELECT COUNT(DISTINCT server_name) FROM tools) as servers_with_tools,
+            (SELECT COUNT(*) FROM resources) as total_resources,
+            (SELECT COUNT(*) FROM prompts) as total_prompts
+        FROM servers
+    """, (_updated_cutoff(),))
+    counts = cursor.fetchone()
+    stats["total_servers"] = counts["total_servers"]
     
     # By status
     cursor.execute("SELECT status, COUNT(*) as count FROM servers GROUP BY status")
@@ -50,128 +141,108 @@ def get_stats(db_path: Path = DATABASE_PATH) -> Dict[str, Any]:
     """)
     stats["by_transport"] = {row["transport_type"]: row["count"] for row in cursor.fetchall()}
     
-    # Servers with remotes
-    cursor.execute("SELECT COUNT(DISTINCT server_name) as count FROM server_remotes")
-    stats["with_remote_url"] = cursor.fetchone()["count"]
-    
-    # Servers requiring auth (has secret env vars)
-    cursor.execute("""
-        SELECT COUNT(DISTINCT server_name) as count 
-        FROM environment_variables 
-        WHERE is_secret = 1
-    """)
-    stats["requires_auth"] = cursor.fetchone()["count"]
-    
-    # Tools stats
-    cursor.execute("SELECT COUNT(*) as count FROM tools")
-    stats["total_tools"] = cursor.fetchone()["count"]
-    
-    cursor.execute("SELECT COUNT(DISTINCT server_name) as count FROM tools")
-    stats["servers_with_tools"] = cursor.fetchone()["count"]
-    
-    # Resources stats
-    cursor.execute("SELECT COUNT(*) as count FROM resources")
-    stats["total_resources"] = cursor.fetchone()["count"]
-    
-    # Prompts stats
-    cursor.execute("SELECT COUNT(*) as count FROM prompts")
-    stats["total_prompts"] = cursor.fetchone()["count"]
-    
-    # Recently updated (last 30 days)
-    cursor.execute("""
-        SELECT COUNT(*) as count FROM servers 
-        WHERE updated_at >= datetime('now', '-30 days')
-    """)
-    stats["updated_last_30_days"] = cursor.fetchone()["count"]
+    for key in ("with_remote_url", "requires_auth", "total_tools", "servers_with_tools",
+                "total_resources", "total_prompts", "updated_last_30_days"):
+        stats[key] = counts[key]
     
     # ==================== ENRICHMENT STATS ====================
     
+    # Enrichment tables only exist once enrich.py has run
+    present = {row["name"] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    
     # GitHub signals
-    try:
-        cursor.execute("SELECT COUNT(*) as count FROM github_signals")
-        stats["github_enriched"] = cursor.fetchone()["count"]
-        
-        cursor.execute("SELECT SUM(stars) as total FROM github_signals")
-        stats["total_github_stars"] = cursor.fetchone()["total"] or 0
-        
-        cursor.execute("SELECT AVG(stars) as avg FROM github_signals WHERE stars > 0")
-        result = cursor.fetchone()["avg"]
-        stats["avg_github_stars"] = round(result, 1) if result else 0
-    except:
+    if "github_signals" in present:
+        cursor.execute("""
+            SELECT COUNT(*) as count, SUM(stars) as total,
+                   AVG(CASE WHEN stars > 0 THEN stars END) as avg
+            FROM github_signals
+        """)
+        row = cursor.fetchone()
+        stats["github_enriched"] = row["count"]
+        stats["total_github_stars"] = row["total"] or 0
+        stats["avg_github_stars"] = round(row["avg"], 1) if row["avg"] else 0
+    else:
         stats["github_enriched"] = 0
     
     # Package downloads
-    try:
+    if "package_downloads" in present:
         cursor.execute("SELECT COUNT(*) as count FROM package_downloads")
         stats["download_stats"] = cursor.fetchone()["count"]
-    except:
+    else:
         stats["download_stats"] = 0
     
     # Backlink scores
-    try:
-        cursor.execute("SELECT COUNT(*) as count FROM backlink_scores WHERE normalized_score > 0")
-        stats["servers_with_scores"] = cursor.fetchone()["count"]
-        
-        cursor.execute("SELECT MAX(normalized_score) as max FROM backlink_scores")
-        result = cursor.fetchone()["max"]
-        stats["max_backlink_score"] = round(result, 3) if result else 0
-    except:
+    if "backlink_scores" in present:
+        cursor.execute("""
+            SELECT COUNT(CASE WHEN normalized_score > 0 THEN 1 END) as count,
+                   MAX(normalized_score) as max
+            FROM backlink_scores
+        """)
+        row = cursor.fetchone()
+        stats["servers_with_scores"] = row["count"]
+        stats["max_backlink_score"] = round(row["max"], 3) if row["max"] else 0
+    else:
         stats["servers_with_scores"] = 0
     
-    conn.close()
+    if own_conn:
+        conn.close()
     return stats
 
 
 def print_stats(stats: Dict[str, Any]):
     """Pretty print statistics."""
-    print("\n" + "=" * 50)
-    print("📊 MCP Registry Statistics")
-    print("=" * 50)
+    lines = []
+    lines.append("\n" + "=" * 50)
+    lines.append("📊 MCP Registry Statistics")
+    lines.append("=" * 50)
     
-    print(f"\n📦 Total Servers: {stats['total_servers']}")
-    print(f"   • Requires Auth: {stats.get('requires_auth', 0)}")
-    print(f"   • With Remote URL: {stats.get('with_remote_url', 0)}")
+    lines.append(f"\n📦 Total Servers: {stats['total_servers']}")
+    lines.append(f"   • Requires Auth: {stats.get('requires_auth', 0)}")
+    lines.append(f"   • With Remote URL: {stats.get('with_remote_url', 0)}")
     
-    print("\n📈 By Status:")
+    lines.append("\n📈 By Status:")
     for status, count in stats.get("by_status", {}).items():
-        print(f"   • {status or 'unknown'}: {count}")
+        lines.append(f"   • {status or 'unknown'}: {count}")
     
-    print("\n📦 By Package Type:")
+    lines.append("\n📦 By Package Type:")
     for pkg_type, count in stats.get("by_package_type", {}).items():
-        print(f"   • {pkg_type}: {count}")
+        lines.append(f"   • {pkg_type}: {count}")
     
-    print("\n🚀 By Transport:")
+    lines.append("\n🚀 By Transport:")
     for transport, count in stats.get("by_transport", {}).items():
-        print(f"   • {transport}: {count}")
+        lines.append(f"   • {transport}: {count}")
     
-    print(f"\n🔧 Extracted Data:")
-    print(f"   • Tools: {stats.get('total_tools', 0)} (from {stats.get('servers_with_tools', 0)} servers)")
-    print(f"   • Resources: {stats.get('total_resources', 0)}")
-    print(f"   • Prompts: {stats.get('total_prompts', 0)}")
+    lines.append(f"\n🔧 Extracted Data:")
+    lines.append(f"   • Tools: {stats.get('total_tools', 0)} (from {stats.get('servers_with_tools', 0)} servers)")
+    lines.append(f"   • Resources: {stats.get('total_resources', 0)}")
+    lines.append(f"   • Prompts: {stats.get('total_prompts', 0)}")
     
     # Enrichment stats
     if stats.get('github_enriched', 0) > 0:
-        print(f"\n⭐ GitHub Enrichment:")
-        print(f"   • Servers enriched: {stats.get('github_enriched', 0)}")
-        print(f"   • Total stars: {stats.get('total_github_stars', 0):,}")
-        print(f"   • Avg stars: {stats.get('avg_github_stars', 0):.1f}")
+        lines.append(f"\n⭐ GitHub Enrichment:")
+        lines.append(f"   • Servers enriched: {stats.get('github_enriched', 0)}")
+        lines.append(f"   • Total stars: {stats.get('total_github_stars', 0):,}")
+        lines.append(f"   • Avg stars: {stats.get('avg_github_stars', 0):.1f}")
     
     if stats.get('download_stats', 0) > 0:
-        print(f"\n📈 Package Downloads:")
-        print(f"   • Packages tracked: {stats.get('download_stats', 0)}")
+        lines.append(f"\n📈 Package Downloads:")
+        lines.append(f"   • Packages tracked: {stats.get('download_stats', 0)}")
     
     if stats.get('servers_with_scores', 0) > 0:
-        print(f"\n🎯 Backlink Scores:")
-        print(f"   • Servers with scores: {stats.get('servers_with_scores', 0)}")
-        print(f"   • Max score: {stats.get('max_backlink_score', 0):.3f}")
+        lines.append(f"\n🎯 Backlink Scores:")
+        lines.append(f"   • Servers with scores: {stats.get('servers_with_scores', 0)}")
+        lines.append(f"   • Max score: {stats.get('max_backlink_score', 0):.3f}")
     
-    print(f"\n🕐 Updated in last 30 days: {stats.get('updated_last_30_days', 0)}")
-    print()
+    lines.append(f"\n🕐 Updated in last 30 days: {stats.get('updated_last_30_days', 0)}")
+    lines.append("")
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
-def top_servers(db_path: Path = DATABASE_PATH, metric: str = "stars", limit: int = 20) -> List[Dict]:
+def top_servers(db_path: Path = DATABASE_PATH, metric: str = "stars", limit: int = 20, conn: Optional[sqlite3.Connection] = None) -> List[Dict]:
     """Get top servers by a specific metric."""
-    conn = get_connection(db_path)
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect(db_path)
     cursor = conn.cursor()
     
     if metric == "stars":
@@ -202,13 +273,18 @@ def top_servers(db_path: Path = DATABASE_PATH, metric: str = "stars", limit: int
             LIMIT ?
         """, (limit,))
     elif metric == "tools":
+        # Count from the tools index first so only the top rows touch servers
         cursor.execute("""
-            SELECT s.name, s.description, COUNT(t.id) as tool_count
-            FROM servers s
-            JOIN tools t ON s.name = t.server_name
-            GROUP BY s.name
-            ORDER BY tool_count DESC
-            LIMIT ?
+            SELECT s.name, s.description, tc.tool_count
+            FROM (
+                SELECT server_name, COUNT(*) as tool_count
+                FROM tools
+                GROUP BY server_name
+                ORDER BY tool_count DESC, server_name
+                LIMIT ?
+            ) tc
+            JOIN servers s ON s.name = tc.server_name
+            ORDER BY tc.tool_count DESC, s.name
         """, (limit,))
     else:
         cursor.execute("""
@@ -219,15 +295,17 @@ def top_servers(db_path: Path = DATABASE_PATH, metric: str = "stars", limit: int
         """, (limit,))
     
     servers = [dict(s) for s in cursor.fetchall()]
-    conn.close()
+    if own_conn:
+        conn.close()
     return servers
 
 
 def print_top_servers(servers: List[Dict], metric: str):
     """Pretty print top servers."""
-    print("\n" + "=" * 70)
-    print(f"🏆 Top Servers by {metric.title()}")
-    print("=" * 70)
+    lines = []
+    lines.append("\n" + "=" * 70)
+    lines.append(f"🏆 Top Servers by {metric.title()}")
+    lines.append("=" * 70)
     
     for i, server in enumerate(servers, 1):
         name = server['name'][:40]
@@ -242,117 +320,152 @@ def print_top_servers(servers: List[Dict], metric: str):
         else:
             value = server.get('updated_at', '')
         
-        print(f"  {i:2}. {name:40} {value}")
-    print()
+        lines.append(f"  {i:2}. {name:40} {value}")
+    lines.append("")
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 # ==================== LIST FUNCTIONS ====================
 
-def list_servers(db_path: Path = DATABASE_PATH, limit: int = 20, search: Optional[str] = None) -> List[Dict]:
+_FTS_SCRUB = re.compile(r'[^\w\s]')
+
+
+def fts_prefix_query(search: str) -> str:
+    """
+    Turn a --search string into an FTS5 MATCH expression where every term is
+    a quoted prefix ("git"* matches github), so punctuation and words like
+    AND/OR can't break the query. No terms matches nothing.
+    """
+    return " ".join(f'"{term}"*' for term in _FTS_SCRUB.sub(' ', search).split()) or '""'
+
+def list_servers(db_path: Path = DATABASE_PATH, limit: int = 20, search: Optional[str] = None, conn: Optional[sqlite3.Connection] = None) -> List[Dict]:
 
     """List servers from the database."""
-    conn = get_connection(db_path)
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect(db_path)
     cursor = conn.cursor()
     
-    query = """
+    # Searches go through the servers_fts index, best match first
+    source = "servers_fts f JOIN servers s ON s.id = f.rowid" if search else "servers s"
+    query = f"""
         SELECT s.name, s.description, s.status, s.updated_at, s.repository_url,
-               (SELECT COUNT(*) FROM environment_variables ev 
-                WHERE ev.server_name = s.name AND ev.is_secret = 1) as auth_vars,
-               (SELECT COUNT(*) FROM tools t WHERE t.server_name = s.name) as tool_count
-        FROM servers s
+               s.requires_auth, s.tool_count
+        FROM {source}
     """
     params = []
     
     if search:
-        query += " WHERE s.name LIKE ? OR s.description LIKE ?"
-        params = [f"%{search}%", f"%{search}%"]
-    
-    query += " ORDER BY s.updated_at DESC LIMIT ?"
+        query += " WHERE servers_fts MATCH ? ORDER BY f.rank LIMIT ?"
+        params = [fts_prefix_query(search)]
+    else:
+        query += " ORDER BY s.updated_at DESC LIMIT ?"
     params.append(limit)
     
     cursor.execute(query, params)
     servers = [dict(s) for s in cursor.fetchall()]
     
-    conn.close()
+    if own_conn:
+        conn.close()
     return servers
 
 
-def list_tools(db_path: Path = DATABASE_PATH, limit: int = 50, search: Optional[str] = None) -> List[Dict]:
+def list_tools(db_path: Path = DATABASE_PATH, limit: int = 50, search: Optional[str] = None, conn: Optional[sqlite3.Connection] = None) -> List[Dict]:
     """List extracted tools from the database."""
-    conn = get_connection(db_path)
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect(db_path)
     cursor = conn.cursor()
     
-    query = """
+    # Searches go through the tools_list_fts index, best match first
+    source = "tools_list_fts f JOIN tools t ON t.id = f.rowid" if search else "tools t"
+    query = f"""
         SELECT t.server_name, t.tool_name, t.title, t.description,
-               (SELECT COUNT(*) FROM environment_variables ev 
-                WHERE ev.server_name = t.server_name AND ev.is_secret = 1) > 0 as requires_auth
-        FROM tools t
+               COALESCE(s.requires_auth, 0) as requires_auth
+        FROM {source}
+        LEFT JOIN servers s ON s.name = t.server_name
     """
     params = []
     
     if search:
-        query += " WHERE t.tool_name LIKE ? OR t.description LIKE ?"
-        params = [f"%{search}%", f"%{search}%"]
-    
-    query += " ORDER BY t.server_name, t.tool_name LIMIT ?"
+        query += " WHERE tools_list_fts MATCH ? ORDER BY f.rank LIMIT ?"
+        params = [fts_prefix_query(search)]
+    else:
+        query += " ORDER BY t.server_name, t.tool_name LIMIT ?"
     params.append(limit)
     
     cursor.execute(query, params)
     tools = [dict(t) for t in cursor.fetchall()]
     
-    conn.close()
+    if own_conn:
+        conn.close()
     return tools
 
 
 def print_servers(servers: List[Dict]):
     """Pretty print server list."""
-    print("\n" + "=" * 80)
-    print("📋 MCP Servers")
-    print("=" * 80)
+    lines = []
+    lines.append("\n" + "=" * 80)
+    lines.append("📋 MCP Servers")
+    lines.append("=" * 80)
     
     for server in servers:
-        auth = "🔒" if server.get('auth_vars', 0) > 0 else "🔓"
+        auth = "🔒" if server.get('requires_auth') else "🔓"
         tools = f"[{server.get('tool_count', 0)} tools]" if server.get('tool_count', 0) > 0 else ""
-        print(f"\n{auth} {server['name']} {tools}")
-        if server.get('description'):
-            desc = server['description'][:100] + "..." if len(server.get('description', '')) > 100 else server.get('description', '')
-            print(f"   {desc}")
-        print(f"   Status: {server.get('status', 'unknown')} | Updated: {server.get('updated_at', 'unknown')}")
-    print()
+        lines.append(f"\n{auth} {server['name']} {tools}")
+        desc = server.get('description')
+        if desc:
+            if len(desc) > 100:
+                desc = desc[:100] + "..."
+            lines.append(f"   {desc}")
+        lines.append(f"   Status: {server.get('status', 'unknown')} | Updated: {server.get('updated_at', 'unknown')}")
+    lines.append("")
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 def print_tools(tools: List[Dict]):
     """Pretty print tool list."""
-    print("\n" + "=" * 80)
-    print("🔧 MCP Tools")
-    print("=" * 80)
+    lines = []
+    lines.append("\n" + "=" * 80)
+    lines.append("🔧 MCP Tools")
+    lines.append("=" * 80)
     
     for tool in tools:
         auth = "🔒" if tool.get('requires_auth') else "🔓"
         title = f" ({tool['title']})" if tool.get('title') else ""
-        print(f"\n{auth} {tool['server_name']} → {tool['tool_name']}{title}")
-        if tool.get('description'):
-            desc = tool['description'][:100] + "..." if len(tool.get('description', '')) > 100 else tool.get('description', '')
-            print(f"   {desc}")
-    print()
+        lines.append(f"\n{auth} {tool['server_name']} → {tool['tool_name']}{title}")
+        desc = tool.get('description')
+        if desc:
+            if len(desc) > 100:
+                desc = desc[:100] + "..."
+            lines.append(f"   {desc}")
+    lines.append("")
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 # ==================== DETAILS FUNCTIONS ====================
 
-def get_server_details(db_path: Path, server_name: str) -> Optional[Dict]:
-    """Get full details for a specific server."""
-    conn = get_connection(db_path)
+def get_server_details(db_path: Path, server_name: str, conn: Optional[sqlite3.Connection] = None,
+                       include_raw: bool = False) -> Optional[Dict]:
+    """Get full details for a specific server, plus its decoded registry JSON if include_raw."""
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect(db_path)
     cursor = conn.cursor()
     
     # Get server
     cursor.execute("SELECT * FROM servers WHERE name = ?", (server_name,))
     server = cursor.fetchone()
     if not server:
-        conn.close()
+        if own_conn:
+            conn.close()
         return None
     
     result = dict(server)
-    result.pop('raw_json', None)  # Remove raw JSON for cleaner output
+    if include_raw:
+        result['raw_json'] = decode_raw_json(result.get('raw_json'))
+    else:
+        result.pop('raw_json', None)  # Remove raw JSON for cleaner output
     
     # Get packages
     cursor.execute("SELECT * FROM server_packages WHERE server_name = ?", (server_name,))
@@ -382,13 +495,16 @@ def get_server_details(db_path: Path, server_name: str) -> Optional[Dict]:
     cursor.execute("SELECT * FROM server_icons WHERE server_name = ?", (server_name,))
     result["icons"] = [dict(i) for i in cursor.fetchall()]
     
-    conn.close()
+    if own_conn:
+        conn.close()
     return result
 
 
-def get_tool_details(db_path: Path, tool_name: str) -> List[Dict]:
+def get_tool_details(db_path: Path, tool_name: str, conn: Optional[sqlite3.Connection] = None) -> List[Dict]:
     """Get details for tools matching a name."""
-    conn = get_connection(db_path)
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect(db_path)
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -411,18 +527,86 @@ def get_tool_details(db_path: Path, tool_name: str) -> List[Dict]:
         
         tools.append(tool)
     
-    conn.close()
+    if own_conn:
+        conn.close()
     return tools
 
 
 # ==================== EXPORT FUNCTIONS ====================
 
-def export_to_csv(db_path: Path = DATABASE_PATH, output_path: Optional[Path] = None):
+# input_schema is validated and minified by SQLite's json() and spliced into
+# the export verbatim (see _RawJSON) rather than parsed and re-serialized
+_INPUT_SCHEMA_JSON = "CASE WHEN input_schema != '' THEN json(input_schema) ELSE input_schema END as input_schema"
+
+
+class _RawJSON:
+    """
+    Splices already-serialized JSON values into json.dumps output. add()
+    returns a placeholder string to put in the object; dumps() swaps each
+    quoted placeholder for its raw value.
+    """
+    
+    def __init__(self):
+        self.token = f"raw-json-{uuid.uuid4().hex}-"
+        self.pattern = re.compile(re.escape(f'"{self.token}') + r'(\d+)"')
+        self.values: List[str] = []
+    
+    def add(self, raw: str) -> str:
+        self.values.append(raw)
+        return f"{self.token}{len(self.values) - 1}"
+    
+    def dumps(self, obj: Any, **kwargs) -> str:
+        text = json.dumps(obj, **kwargs)
+        text = self.pattern.sub(lambda m: self.values[int(m.group(1))], text)
+        self.values.clear()
+        return text
+
+
+def _json_dump_kwargs(pretty: bool) -> Dict[str, Any]:
+    """json.dumps options for the exports: indented with --pretty, else compact."""
+    if pretty:
+        return {'indent': 2, 'default': str}
+    return {'separators': (',', ':'), 'default': str}
+
+
+# export_to_json loads each child table in one pass and buckets the rows by
+# server instead of querying every table once per server.
+_EXPORT_PACKAGES_SQL = """
+    SELECT server_name, registry_type, identifier, version, transport_type, transport_url 
+    FROM server_packages ORDER BY server_name, id
+"""
+_EXPORT_REMOTES_SQL = "SELECT server_name, transport_type, url FROM server_remotes ORDER BY server_name, id"
+_EXPORT_ENV_VARS_SQL = """
+    SELECT server_name, var_name, description, is_required, is_secret 
+    FROM environment_variables ORDER BY server_name, id
+"""
+_EXPORT_TOOLS_SQL = f"""
+    SELECT server_name, tool_name, title, description, {_INPUT_SCHEMA_JSON} 
+    FROM tools ORDER BY server_name, id
+"""
+_EXPORT_RESOURCES_SQL = "SELECT server_name, uri, name, description, mime_type FROM resources ORDER BY server_name, id"
+_EXPORT_PROMPTS_SQL = "SELECT server_name, prompt_name, description FROM prompts ORDER BY server_name, id"
+
+# Each tool's parameters as one JSON array, assembled by SQLite in the tools
+# query itself (in the unique index's param_name order)
+_TOOL_PARAMETERS_JSON = """(
+            SELECT json_group_array(json_object(
+                'param_name', param_name, 'param_type', param_type,
+                'description', description, 'is_required', is_required,
+                'default_value', default_value, 'enum_values', enum_values
+            ))
+            FROM tool_parameters tp
+            WHERE tp.server_name = t.server_name AND tp.tool_name = t.tool_name
+        ) as parameters_json"""
+
+def export_to_csv(db_path: Path = DATABASE_PATH, output_path: Optional[Path] = None, conn: Optional[sqlite3.Connection] = None):
     """Export servers to CSV for external visualization tools."""
     if output_path is None:
         output_path = db_path.parent / "mcp_servers.csv"
     
-    conn = get_connection(db_path)
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect(db_path)
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -436,149 +620,146 @@ def export_to_csv(db_path: Path = DATABASE_PATH, output_path: Optional[Path] = N
             s.published_at, 
             s.updated_at,
             GROUP_CONCAT(DISTINCT sp.registry_type) as package_types,
-            (SELECT COUNT(*) FROM environment_variables ev 
-             WHERE ev.server_name = s.name AND ev.is_secret = 1) as auth_vars,
-            (SELECT COUNT(*) FROM tools t WHERE t.server_name = s.name) as tool_count
+            CASE WHEN s.requires_auth THEN 'True' ELSE 'False' END as requires_auth,
+            s.tool_count
         FROM servers s
         LEFT JOIN server_packages sp ON s.name = sp.server_name
         GROUP BY s.name
         ORDER BY s.updated_at DESC
     """)
     
-    rows = cursor.fetchall()
+    # The SELECT is already in CSV shape, so rows stream to the writer as-is,
+    # a batch at a time, and are counted on the way through
+    cursor.arraysize = 1000
+    exported = 0
+    
+    def counted_rows():
+        nonlocal exported
+        for batch in iter(cursor.fetchmany, []):
+            exported += len(batch)
+            yield from batch
     
     with open(output_path, 'w', newline='', encoding='utf-8') as f:
         writer = csv.writer(f)
-        writer.writerow([
-            'name', 'description', 'version', 'status', 'is_latest', 
-            'repository_url', 'published_at', 'updated_at', 'package_types',
-            'requires_auth', 'tool_count'
-        ])
-        for row in rows:
-            writer.writerow([
-                row['name'],
-                row['description'],
-                row['version'],
-                row['status'],
-                row['is_latest'],
-                row['repository_url'],
-                row['published_at'],
-                row['updated_at'],
-                row['package_types'],
-                row['auth_vars'] > 0,
-                row['tool_count']
-            ])
-    
-    conn.close()
-    print(f"✓ Exported {len(rows)} servers to {output_path}")
-
-
-def export_to_json(db_path: Path = DATABASE_PATH, output_path: Optional[Path] = None):
-    """Export all data to JSON for web visualization."""
+        writer.writerow([col[0] for col in cursor.description])
+        writer.writerows(counted_rows())
+    
+    if own_conn:
+        conn.close()
+    print(f"✓ Exported {exported} servers to {output_path}")
+
+
+def export_to_json(db_path: Path = DATABASE_PATH, output_path: Optional[Path] = None,
+                   pretty: bool = False, conn: Optional[sqlite3.Connection] = None,
+                   include_raw: bool = False):
+    """
+    Export all data to JSON for web visualization (compact unless pretty).
+    
+    include_raw keeps each server's decoded registry JSON under raw_json.
+    """
     if output_path is None:
         output_path = db_path.parent / "mcp_data.json"
     
-    conn = get_connection(db_path)
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect(db_path)
     cursor = conn.cursor()
     
-    # Get all servers with their related data
-    cursor.execute("SELECT * FROM servers ORDER BY updated_at DESC")
-    servers = []
-    
-    for row in cursor.fetchall():
-        server = dict(row)
-        server_name = server['name']
-        server.pop('raw_json', None)
-        
-        # Get packages
-        cursor.execute("""
-            SELECT registry_type, identifier, version, transport_type, transport_url 
-            FROM server_packages WHERE server_name = ?
-        """, (server_name,))
-        server['packages'] = [dict(p) for p in cursor.fetchall()]
-        
-        # Get remotes
-        cursor.execute("SELECT transport_type, url FROM server_remotes WHERE server_name = ?", (server_name,))
-        server['remotes'] = [dict(r) for r in cursor.fetchall()]
-        
-        # Get env vars
-        cursor.execute("""
-            SELECT var_name, description, is_required, is_secret 
-            FROM environment_variables WHERE server_name = ?
-        """, (server_name,))
-        server['environment_variables'] = [dict(e) for e in cursor.fetchall()]
-        
-        # Get tools
-        cursor.execute("""
-            SELECT tool_name, title, description, input_schema 
-            FROM tools WHERE server_name = ?
-        """, (server_name,))
-        tools = []
-        for t in cursor.fetchall():
-            tool = dict(t)
-            if tool.get('input_schema'):
-                tool['input_schema'] = json.loads(tool['input_schema'])
-            tools.append(tool)
-        server['tools'] = tools
-        
-        # Get resources
-        cursor.execute("SELECT uri, name, description, mime_type FROM resources WHERE server_name = ?", (server_name,))
-        server['resources'] = [dict(r) for r in cursor.fetchall()]
-        
-        # Get prompts
-        cursor.execute("SELECT prompt_name, description FROM prompts WHERE server_name = ?", (server_name,))
-        server['prompts'] = [dict(p) for p in cursor.fetchall()]
-        
-        servers.append(server)
+    # Load child rows once per table, bucketed by server
+    children = {}
+    for key, sql in (
+        ('packages', _EXPORT_PACKAGES_SQL),
+        ('remotes', _EXPORT_REMOTES_SQL),
+        ('environment_variables', _EXPORT_ENV_VARS_SQL),
+        ('tools', _EXPORT_TOOLS_SQL),
+        ('resources', _EXPORT_RESOURCES_SQL),
+        ('prompts', _EXPORT_PROMPTS_SQL),
+    ):
+        by_server = defaultdict(list)
+        for row in cursor.execute(sql):
+            item = dict(row)
+            by_server[item.pop('server_name')].append(item)
+        children[key] = by_server
     
     # Summary stats
-    stats = get_stats(db_path)
+    stats = get_stats(db_path, conn=conn)
     
-    output = {
-        'extracted_at': servers[0].get('extracted_at') if servers else None,
-        'stats': stats,
-        'servers': servers
-    }
+    # Stream servers straight to the file instead of building the full list and
+    # then a serialized copy of it. The layout matches json.dump(output) with
+    # the same options: pretty output indents each server one level deeper.
+    dump_kwargs = _json_dump_kwargs(pretty)
+    item_sep, list_start, list_end = (',\n    ', '\n    ', '\n  ]\n}') if pretty else (',', '', ']}')
+    cursor.execute("SELECT * FROM servers ORDER BY updated_at DESC")
+    count = 0
+    raw = _RawJSON()
     
     with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(output, f, indent=2, default=str)
+        for row in cursor:
+            server = dict(row)
+            server_name = server['name']
+            if include_raw:
+                server['raw_json'] = decode_raw_json(server.get('raw_json'))
+            else:
+                server.pop('raw_json', None)
+            
+            # Names are unique, so each bucket is released once it is written
+            for key, by_server in children.items():
+                server[key] = by_server.pop(server_name, [])
+            for tool in server['tools']:
+                if tool.get('input_schema'):
+                    tool['input_schema'] = raw.add(tool['input_schema'])
+            
+            if count == 0:
+                # Everything up to the opening bracket of the servers list
+                head = json.dumps({'extracted_at': server.get('extracted_at'), 'stats': stats, 'servers': []}, **dump_kwargs)
+                f.write(head[:head.rindex('[]') + 1] + list_start)
+            else:
+                f.write(item_sep)
+            f.write(raw.dumps(server, **dump_kwargs).replace('\n', '\n    '))
+            count += 1
+        
+        if count == 0:
+            json.dump({'extracted_at': None, 'stats': stats, 'servers': []}, f, **dump_kwargs)
+        else:
+            f.write(list_end)
     
-    conn.close()
-    print(f"✓ Exported {len(servers)} servers to {output_path}")
+    if own_conn:
+        conn.close()
+    print(f"✓ Exported {count} servers to {output_path}")
 
 
-def export_tools_json(db_path: Path = DATABASE_PATH, output_path: Optional[Path] = None):
-    """Export just tools to JSON."""
+def export_tools_json(db_path: Path = DATABASE_PATH, output_path: Optional[Path] = None,
+                      pretty: bool = False, conn: Optional[sqlite3.Connection] = None):
+    """Export just tools to JSON (compact unless pretty)."""
     if output_path is None:
         output_path = db_path.parent / "mcp_tools.json"
     
-    conn = get_connection(db_path)
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect(db_path)
     cursor = conn.cursor()
     
-    cursor.execute("""
-        SELECT t.*, s.description as server_description,
-               (SELECT COUNT(*) FROM environment_variables ev 
-                WHERE ev.server_name = t.server_name AND ev.is_secret = 1) > 0 as requires_auth
+    cursor.execute(f"""
+        SELECT t.id, t.server_name, t.tool_name, t.title, t.description,
+               {_INPUT_SCHEMA_JSON}, t.output_schema, t.extracted_at,
+               s.description as server_description,
+               s.requires_auth,
+               {_TOOL_PARAMETERS_JSON}
         FROM tools t
         JOIN servers s ON t.server_name = s.name
         ORDER BY t.server_name, t.tool_name
     """)
     
     tools = []
-    for row in cursor.fetchall():
+    raw = _RawJSON()
+    for row in cursor:
         tool = dict(row)
         
-        # Parse input schema
+        # Pass the input schema through as JSON
         if tool.get('input_schema'):
-            tool['input_schema'] = json.loads(tool['input_schema'])
+            tool['input_schema'] = raw.add(tool['input_schema'])
         
-        # Get parameters
-        cursor.execute("""
-            SELECT param_name, param_type, description, is_required, default_value, enum_values
-            FROM tool_parameters 
-            WHERE server_name = ? AND tool_name = ?
-        """, (tool['server_name'], tool['tool_name']))
-        tool['parameters'] = [dict(p) for p in cursor.fetchall()]
+        tool['parameters'] = json.loads(tool.pop('parameters_json'))
         
         tools.append(tool)
     
@@ -588,9 +769,10 @@ def export_tools_json(db_path: Path = DATABASE_PATH, output_path: Optional[Path]
     }
     
     with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(output, f, indent=2, default=str)
+        f.write(raw.dumps(output, **_json_dump_kwargs(pretty)))
     
-    conn.close()
+    if own_conn:
+        conn.close()
     print(f"✓ Exported {len(tools)} tools to {output_path}")
 
 
@@ -618,6 +800,7 @@ def main():
     server_parser = subparsers.add_parser("server", help="Get details for a specific server")
     server_parser.add_argument("name", type=str, help="Server name")
     server_parser.add_argument("--db", type=str, default=str(DATABASE_PATH), help="Database path")
+    server_parser.add_argument("--raw", action="store_true", help="Include the decoded registry JSON")
     
     # Tool details command
     tool_parser = subparsers.add_parser("tool", help="Get details for a specific tool")
@@ -633,11 +816,14 @@ def main():
     json_parser = subparsers.add_parser("json", help="Export all data to JSON")
     json_parser.add_argument("--output", type=str, help="Output JSON path")
     json_parser.add_argument("--db", type=str, default=str(DATABASE_PATH), help="Database path")
+    json_parser.add_argument("--pretty", action="store_true", help="Indent the JSON output")
+    json_parser.add_argument("--raw", action="store_true", help="Include each server's decoded registry JSON")
     
     # Export tools JSON command
     tools_json_parser = subparsers.add_parser("tools-json", help="Export tools to JSON")
     tools_json_parser.add_argument("--output", type=str, help="Output JSON path")
     tools_json_parser.add_argument("--db", type=str, default=str(DATABASE_PATH), help="Database path")
+    tools_json_parser.add_argument("--pretty", action="store_true", help="Indent the JSON output")
     
     # Top servers command
     top_parser = subparsers.add_parser("top", help="Show top servers by metric")
@@ -660,7 +846,7 @@ def main():
         tools = list_tools(Path(args.db), limit=args.limit, search=args.search)
         print_tools(tools)
     elif args.command == "server":
-        details = get_server_details(Path(args.db), args.name)
+        details = get_server_details(Path(args.db), args.name, include_raw=args.raw)
         if details:
             print(json.dumps(details, indent=2, default=str))
         else:
@@ -676,10 +862,10 @@ def main():
         export_to_csv(Path(args.db), output)
     elif args.command == "json":
         output = Path(args.output) if args.output else None
-        export_to_json(Path(args.db), output)
+        export_to_json(Path(args.db), output, pretty=args.pretty, include_raw=args.raw)
     elif args.command == "tools-json":
         output = Path(args.output) if args.output else None
-        export_tools_json(Path(args.db), output)
+        export_tools_json(Path(args.db), output, pretty=args.pretty)
     elif args.command == "top":
         servers = top_servers(Path(args.db), metric=args.by, limit=args.limit)
         print_top_servers(servers, args.by)
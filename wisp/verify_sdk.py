@@ -11,18 +11,25 @@ from wisp_sdk.errors import WispError
 async def main():
     client = WispClient()
     
+    # The two checks are independent requests, so run them concurrently and
+    # report each in turn
+    keys, result = await asyncio.gather(
+        client.get_available_keys(),
+        # Search for something general
+        client.search("wikipedia"),
+        return_exceptions=True,
+    )
+    
     print("--- Testing Connection & Keys ---")
-    try:
-        keys = await client.get_available_keys()
-        print(f"✅ Connected! Available keys: {len(keys)}")
-    except Exception as e:
-        print(f"❌ Connection failed: {e}")
+    if isinstance(keys, Exception):
+        print(f"❌ Connection failed: {keys}")
         return
+    print(f"✅ Connected! Available keys: {len(keys)}")
 
     print("\n--- Testing Search ---")
     try:
-        # Search for something general
-        result = await client.search("wikipedia")
+        if isinstance(result, Exception):
+            raise result
         print(f"✅ Search successful. Found {result.total_candidates} candidates.")
         if result.results:
             first = result.results[0]